@@ -0,0 +1,78 @@
+import time
+from typing import Dict, Any, List
+
+VIDEO_ARCHIVE_COLUMNS = """
+    id, tiktok_url, video_url, author, author_avatar, description,
+    likes, comments, shares, views, hashtags, is_active,
+    created_at, updated_at, added_by, moderation_status, moderated_by, moderated_at, category
+"""
+
+
+def archive_inactive_videos(conn: Any, min_age_days: float = 30.0, batch_size: int = 500,
+                            time_budget: float = 10.0) -> Dict[str, Any]:
+    '''
+    Move videos that have been inactive (rejected or deleted) for min_age_days into tiktok_videos_archive
+    Each batch is one DELETE … RETURNING feeding an INSERT, committed on its own, and claims rows with
+    SKIP LOCKED, so the archiver never holds long locks or blocks moderation writes
+    '''
+    started = time.monotonic()
+    archived = 0
+    while time.monotonic() - started < time_budget:
+        with conn.cursor() as cur:
+            cur.execute(
+                f"""
+                WITH batch AS (
+                    SELECT id FROM tiktok_videos
+                    WHERE is_active = FALSE
+                      AND updated_at < LOCALTIMESTAMP - make_interval(secs => %s)
+                    ORDER BY updated_at, id
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                ), moved AS (
+                    DELETE FROM tiktok_videos t
+                    USING batch b
+                    WHERE t.id = b.id
+                    RETURNING {', '.join('t.' + c.strip() for c in VIDEO_ARCHIVE_COLUMNS.split(','))}
+                )
+                INSERT INTO tiktok_videos_archive ({VIDEO_ARCHIVE_COLUMNS})
+                SELECT {VIDEO_ARCHIVE_COLUMNS} FROM moved
+                """,
+                (min_age_days * 86400, batch_size)
+            )
+            moved = cur.rowcount
+        conn.commit()
+        archived += moved
+        if moved < batch_size:
+            break
+    return {'archived': archived, 'elapsed_ms': round((time.monotonic() - started) * 1000, 1)}
+
+
+def restore_videos(conn: Any, video_ids: List[int]) -> List[int]:
+    '''
+    Move archived videos back into tiktok_videos under their original ids
+    They return active and pending, so they re-enter the moderation queue instead of the feed;
+    ids whose tiktok_url was re-imported in the meantime stay archived
+    '''
+    if not video_ids:
+        return []
+    with conn.cursor() as cur:
+        cur.execute(
+            f"""
+            WITH moved AS (
+                DELETE FROM tiktok_videos_archive a
+                WHERE a.id = ANY(%s::int[])
+                  AND NOT EXISTS (SELECT 1 FROM tiktok_videos t WHERE t.tiktok_url = a.tiktok_url OR t.id = a.id)
+                RETURNING {VIDEO_ARCHIVE_COLUMNS}
+            )
+            INSERT INTO tiktok_videos ({VIDEO_ARCHIVE_COLUMNS})
+            SELECT id, tiktok_url, video_url, author, author_avatar, description,
+                   likes, comments, shares, views, hashtags, TRUE,
+                   created_at, CURRENT_TIMESTAMP, added_by, 'pending', NULL, NULL, category
+            FROM moved
+            RETURNING id
+            """,
+            (list(video_ids),)
+        )
+        restored = sorted(row[0] for row in cur.fetchall())
+    conn.commit()
+    return restored
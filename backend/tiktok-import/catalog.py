@@ -0,0 +1,230 @@
+'''
+NDJSON export and import of the tiktok_videos catalog
+
+Also runnable against DATABASE_URL for dumps larger than one HTTP response:
+    python catalog.py export --status approved > catalog.ndjson
+    python catalog.py import < catalog.ndjson
+'''
+import sys
+from datetime import datetime
+from typing import Dict, Any, IO, Iterator, Optional, Tuple
+from snapshots import drop_feed_snapshots
+
+EXPORT_COLUMNS = """
+    id, tiktok_url, video_url, author, author_avatar, description,
+    likes, comments, shares, views, hashtags, category,
+    moderation_status, moderated_by, moderated_at, is_active, added_by,
+    created_at, updated_at
+"""
+
+# COPY csv with control characters as quote and delimiter: JSON text escapes both, so each line
+# arrives verbatim as one value, without the backslash processing of the text format
+COPY_NDJSON_OPTIONS = "FORMAT csv, QUOTE E'\\x01', DELIMITER E'\\x02'"
+
+
+def parse_export_filters(params: Dict[str, Any]) -> Dict[str, Any]:
+    '''status, category, updated_since and after (exclusive id) from query parameters'''
+    filters: Dict[str, Any] = {}
+    if params.get('status'):
+        filters['status'] = params['status']
+    if params.get('category'):
+        filters['category'] = params['category']
+    if params.get('updated_since'):
+        try:
+            filters['updated_since'] = datetime.fromisoformat(params['updated_since'])
+        except ValueError:
+            raise ValueError('updated_since must be an ISO timestamp')
+    if params.get('after'):
+        try:
+            filters['after'] = int(params['after'])
+        except ValueError:
+            raise ValueError('after must be an integer id')
+    return filters
+
+
+def iter_export_lines(conn: Any, filters: Dict[str, Any], chunk_size: int = 2000,
+                      limit: Optional[int] = None) -> Iterator[Tuple[int, str]]:
+    '''
+    (id, json line) for matching videos in id order
+    Rows come through a server-side named cursor chunk_size at a time and are rendered to JSON
+    by Postgres, so memory stays flat however many rows match
+    '''
+    conditions = ["TRUE"]
+    params: Dict[str, Any] = {}
+    if 'status' in filters:
+        conditions.append("moderation_status = %(status)s")
+        params['status'] = filters['status']
+    if 'category' in filters:
+        conditions.append("category = %(category)s")
+        params['category'] = filters['category']
+    if 'updated_since' in filters:
+        conditions.append("updated_at >= %(updated_since)s")
+        params['updated_since'] = filters['updated_since']
+    if 'after' in filters:
+        conditions.append("id > %(after)s")
+        params['after'] = filters['after']
+    limit_sql = ''
+    if limit is not None:
+        limit_sql = 'LIMIT %(limit)s'
+        params['limit'] = limit
+
+    with conn.cursor(name='catalog_export') as cur:
+        cur.itersize = chunk_size
+        cur.execute(
+            f"""
+            SELECT v.id, row_to_json(v)::text
+            FROM (
+                SELECT {EXPORT_COLUMNS}
+                FROM tiktok_videos
+                WHERE {' AND '.join(conditions)}
+                ORDER BY id
+                {limit_sql}
+            ) v
+            """,
+            params
+        )
+        for video_id, line in cur:
+            yield video_id, line
+
+
+def export_ndjson(conn: Any, out: IO[str], filters: Dict[str, Any], chunk_size: int = 2000,
+                  limit: Optional[int] = None) -> Dict[str, Any]:
+    '''Write matching videos to out, one JSON object per line; returns the count and last id'''
+    count = 0
+    last_id = None
+    for last_id, line in iter_export_lines(conn, filters, chunk_size, limit):
+        out.write(line)
+        out.write('\n')
+        count += 1
+    conn.rollback()
+    return {'exported': count, 'last_id': last_id}
+
+
+def import_ndjson(conn: Any, source: IO[str]) -> Dict[str, Any]:
+    '''
+    Load NDJSON videos: COPY into a temporary staging table, then one upsert on tiktok_url
+    Later lines win over earlier ones for the same url; blank lines are ignored, and lines missing
+    tiktok_url, video_url or author are skipped. Exported ids are ignored so dumps can be loaded into any database.
+    Runs in one transaction and commits at the end; the feed snapshots of every category the import
+    touched are dropped in that transaction, so reads fall back to live queries until the next rebuild
+    '''
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            CREATE TEMP TABLE tiktok_videos_staging (
+                line BIGSERIAL,
+                doc JSONB
+            ) ON COMMIT DROP
+            """
+        )
+        cur.copy_expert(f"COPY tiktok_videos_staging (doc) FROM STDIN WITH ({COPY_NDJSON_OPTIONS})", source)
+        # COPY loads a blank line as NULL
+        cur.execute("DELETE FROM tiktok_videos_staging WHERE doc IS NULL")
+        cur.execute("SELECT COUNT(*) FROM tiktok_videos_staging")
+        received = cur.fetchone()[0]
+
+        cur.execute(
+            """
+            SELECT DISTINCT COALESCE(t.category, 'general')
+            FROM tiktok_videos t
+            JOIN tiktok_videos_staging s ON t.tiktok_url = s.doc->>'tiktok_url'
+            """
+        )
+        categories = {row[0] for row in cur.fetchall()}
+
+        cur.execute(
+            """
+            INSERT INTO tiktok_videos (
+                tiktok_url, video_url, author, author_avatar, description,
+                likes, comments, shares, views, hashtags, category,
+                moderation_status, moderated_by, moderated_at, is_active, added_by,
+                created_at, updated_at
+            )
+            SELECT DISTINCT ON (doc->>'tiktok_url')
+                doc->>'tiktok_url',
+                doc->>'video_url',
+                doc->>'author',
+                doc->>'author_avatar',
+                doc->>'description',
+                COALESCE((doc->>'likes')::int, 0),
+                COALESCE((doc->>'comments')::int, 0),
+                COALESCE((doc->>'shares')::int, 0),
+                COALESCE((doc->>'views')::int, 0),
+                CASE WHEN jsonb_typeof(doc->'hashtags') = 'array'
+                     THEN ARRAY(SELECT jsonb_array_elements_text(doc->'hashtags'))
+                     ELSE '{}'::text[] END,
+                COALESCE(doc->>'category', 'general'),
+                COALESCE(doc->>'moderation_status', 'pending'),
+                doc->>'moderated_by',
+                (doc->>'moderated_at')::timestamp,
+                COALESCE((doc->>'is_active')::boolean, TRUE),
+                doc->>'added_by',
+                COALESCE((doc->>'created_at')::timestamp, CURRENT_TIMESTAMP),
+                CURRENT_TIMESTAMP
+            FROM tiktok_videos_staging
+            WHERE doc->>'tiktok_url' IS NOT NULL AND doc->>'video_url' IS NOT NULL AND doc->>'author' IS NOT NULL
+            ORDER BY doc->>'tiktok_url', line DESC
+            ON CONFLICT (tiktok_url) DO UPDATE SET
+                video_url = EXCLUDED.video_url,
+                author = EXCLUDED.author,
+                author_avatar = EXCLUDED.author_avatar,
+                description = EXCLUDED.description,
+                likes = EXCLUDED.likes,
+                comments = EXCLUDED.comments,
+                shares = EXCLUDED.shares,
+                views = EXCLUDED.views,
+                hashtags = EXCLUDED.hashtags,
+                category = EXCLUDED.category,
+                moderation_status = EXCLUDED.moderation_status,
+                moderated_by = EXCLUDED.moderated_by,
+                moderated_at = EXCLUDED.moderated_at,
+                is_active = EXCLUDED.is_active,
+                updated_at = CURRENT_TIMESTAMP
+            RETURNING COALESCE(category, 'general')
+            """
+        )
+        rows = cur.fetchall()
+        upserted = len(rows)
+        if upserted:
+            categories.update(row[0] for row in rows)
+            drop_feed_snapshots(cur, list(categories) + [None])
+    conn.commit()
+    return {'received': received, 'upserted': upserted, 'skipped': received - upserted}
+
+
+def main(argv: Optional[list] = None) -> int:
+    import argparse
+    import os
+    import psycopg2
+
+    parser = argparse.ArgumentParser(description='NDJSON export/import of tiktok_videos via DATABASE_URL')
+    sub = parser.add_subparsers(dest='command', required=True)
+    export = sub.add_parser('export', help='write NDJSON to stdout')
+    export.add_argument('--status')
+    export.add_argument('--category')
+    export.add_argument('--updated-since')
+    export.add_argument('--after')
+    export.add_argument('--chunk-size', type=int, default=5000)
+    sub.add_parser('import', help='read NDJSON from stdin')
+    args = parser.parse_args(argv)
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    try:
+        if args.command == 'export':
+            filters = parse_export_filters({
+                'status': args.status,
+                'category': args.category,
+                'updated_since': args.updated_since,
+                'after': args.after
+            })
+            result = export_ndjson(conn, sys.stdout, filters, args.chunk_size)
+        else:
+            result = import_ndjson(conn, sys.stdin)
+    finally:
+        conn.close()
+    print(result, file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,127 @@
+import base64
+import json
+from datetime import datetime
+from typing import Dict, Any, Optional, Tuple
+from tracing import span
+
+# Output order of the approved feed and the SQL that produces each field.
+# Timestamps are rendered to text by Postgres so serialization needs no default= hook
+FEED_FIELDS: Tuple[str, ...] = (
+    'id', 'tiktok_url', 'video_url', 'author', 'author_avatar',
+    'description', 'likes', 'comments', 'shares', 'views',
+    'hashtags', 'category', 'created_at', 'app_likes', 'app_saves'
+)
+
+COUNTER_FIELDS = {
+    'app_likes': 'COALESCE(c.app_likes, 0)',
+    'app_saves': 'COALESCE(c.app_saves, 0)'
+}
+
+# Output expressions for fields that are not emitted as the plain v.<name> column
+FIELD_SQL = {
+    'created_at': 'v.created_at::text',
+    **COUNTER_FIELDS
+}
+
+FEED_SHAPES = ('rows', 'columnar')
+
+
+def parse_fields(raw: Optional[str]) -> Tuple[str, ...]:
+    '''Requested feed fields in canonical order; all fields when the parameter is absent'''
+    if not raw:
+        return FEED_FIELDS
+    requested = {name.strip() for name in raw.split(',') if name.strip()}
+    unknown = requested - set(FEED_FIELDS)
+    if unknown:
+        raise ValueError(f'Unknown fields: {", ".join(sorted(unknown))}')
+    return tuple(name for name in FEED_FIELDS if name in requested)
+
+
+def parse_shape(raw: Optional[str]) -> str:
+    shape = raw or 'rows'
+    if shape not in FEED_SHAPES:
+        raise ValueError(f'shape must be one of: {", ".join(FEED_SHAPES)}')
+    return shape
+
+
+def fetch_feed_page(conn: Any, category: Optional[str], cursor_key: Optional[Tuple[datetime, int]],
+                    page_size: int, fields: Tuple[str, ...], shape: str) -> str:
+    '''One keyset page of the approved feed, already serialized'''
+    return render_feed_page(conn, category, cursor_key, page_size, fields, shape)[0]
+
+
+def render_feed_page(conn: Any, category: Optional[str], cursor_key: Optional[Tuple[datetime, int]],
+                     page_size: int, fields: Tuple[str, ...], shape: str) -> Tuple[str, Optional[str]]:
+    '''
+    Serialized page plus its next_cursor, for callers that walk several pages
+    Uses a plain tuple cursor and selects only the requested columns, plus the (created_at, id) cursor key
+    '''
+    base_columns = [name for name in fields if name not in COUNTER_FIELDS and name not in ('id', 'created_at')]
+    inner_select = ', '.join(['id', 'created_at'] + base_columns)
+    outer_select = ', '.join(
+        ['v.id', 'v.created_at::text']
+        + [FIELD_SQL.get(name, f'v.{name}') for name in fields]
+    )
+    join_counters = any(name in COUNTER_FIELDS for name in fields)
+
+    conditions = ["is_active = TRUE", "moderation_status = 'approved'"]
+    params: list = []
+    if category:
+        conditions.append("category = %s")
+        params.append(category)
+    if cursor_key:
+        conditions.append("(created_at, id) < (%s, %s)")
+        params.extend(cursor_key)
+    params.append(page_size + 1)
+
+    with conn.cursor() as cur:
+        cur.execute(
+            f"""
+            SELECT {outer_select}
+            FROM (
+                SELECT {inner_select}
+                FROM tiktok_videos
+                WHERE {' AND '.join(conditions)}
+                ORDER BY created_at DESC, id DESC
+                LIMIT %s
+            ) v
+            {'LEFT JOIN video_counters c ON c.video_id = v.id' if join_counters else ''}
+            ORDER BY v.created_at DESC, v.id DESC
+            """,
+            params
+        )
+        rows = cur.fetchall()
+
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last_id, last_created_at = rows[-1][0], rows[-1][1]
+        next_cursor = encode_cursor(datetime.fromisoformat(last_created_at), last_id)
+
+    with span('serialize', rows=len(rows), shape=shape):
+        values = [row[2:] for row in rows]
+        if shape == 'columnar':
+            columns = {name: [row[i] for row in values] for i, name in enumerate(fields)}
+            payload: Dict[str, Any] = {'fields': list(fields), 'columns': columns, 'count': len(values)}
+        else:
+            payload = {'videos': [dict(zip(fields, row)) for row in values]}
+        payload['next_cursor'] = next_cursor
+        return json.dumps(payload, ensure_ascii=False, separators=(',', ':')), next_cursor
+
+
+def encode_cursor(created_at: datetime, video_id: int) -> str:
+    '''Opaque keyset cursor pointing just past (created_at, id)'''
+    raw = f'{created_at.isoformat()}|{video_id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime, int]]:
+    '''Inverse of encode_cursor; raises ValueError on malformed input'''
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, video_id = base64.urlsafe_b64decode(padded.encode()).decode().split('|', 1)
+        return datetime.fromisoformat(created_at), int(video_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
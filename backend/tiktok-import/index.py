@@ -1,11 +1,71 @@
+import base64
+import hashlib
+import io
 import json
 import os
 import re
-from typing import Dict, Any, Optional
+import sys
+from typing import Dict, Any, List, Optional, Set, Tuple
 import psycopg2
-from psycopg2.extras import RealDictCursor
-import requests
+from psycopg2.extras import RealDictCursor, execute_values
+from db import get_pool
+from cache import ResponseCache
+from ranking import fetch_ranked_feed, refresh_video_scores, sync_video_score, sync_video_scores
+from search import search_videos, normalize_tags, backfill_search_vectors
+from feed import FEED_FIELDS, fetch_feed_page, parse_fields, parse_shape, encode_cursor, decode_cursor
+from archive import archive_inactive_videos, restore_videos
+from catalog import parse_export_filters, export_ndjson, import_ndjson
+from snapshots import (
+    read_feed_snapshot, visible_categories, rebuild_feed_snapshots, rebuild_all_feed_snapshots, drop_feed_snapshots
+)
+from moderation import fetch_pending_page, claim_pending, parse_decisions, apply_decisions
+from tracing import traced, span, propagate
 
+DEFAULT_PAGE_SIZE = int(os.environ.get('FEED_PAGE_SIZE', '50'))
+MAX_PAGE_SIZE = 100
+MAX_BATCH_IMPORT = int(os.environ.get('MAX_BATCH_IMPORT', '100'))
+IMPORT_FETCH_WORKERS = int(os.environ.get('IMPORT_FETCH_WORKERS', '8'))
+RANKED_AFFINITY_WEIGHT = float(os.environ.get('RANKED_AFFINITY_WEIGHT', '2.0'))
+MAX_RANKED_EXCLUDE = 500
+MODERATION_CLAIM_SIZE = int(os.environ.get('MODERATION_CLAIM_SIZE', '20'))
+MODERATION_LEASE_SECONDS = int(os.environ.get('MODERATION_LEASE_SECONDS', '300'))
+MAX_BULK_DECISIONS = int(os.environ.get('MAX_BULK_DECISIONS', '200'))
+FEED_SNAPSHOT_PAGES = int(os.environ.get('FEED_SNAPSHOT_PAGES', '5'))
+EXPORT_PAGE_ROWS = int(os.environ.get('EXPORT_PAGE_ROWS', '5000'))
+MAX_EXPORT_PAGE_ROWS = 50000
+EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', '2000'))
+ARCHIVE_VIDEO_AFTER_DAYS = float(os.environ.get('ARCHIVE_VIDEO_AFTER_DAYS', '30'))
+ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', '500'))
+MAX_RESTORE_IDS = 500
+
+# Compiled once per container instead of on every parse
+TIKTOK_VIDEO_ID_RE = re.compile(r'/video/(\d+)')
+TIKTOK_USERNAME_RE = re.compile(r'@([a-zA-Z0-9._]+)')
+HASHTAG_RE = re.compile(r'#(\w+)')
+
+# Shared by every response; never mutated
+JSON_HEADERS = {
+    'Content-Type': 'application/json',
+    'Access-Control-Allow-Origin': '*'
+}
+PREFLIGHT_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
+    'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, If-None-Match',
+    'Access-Control-Max-Age': '86400'
+}
+CONDITIONAL_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Expose-Headers': 'ETag',
+    'Cache-Control': 'no-cache'
+}
+
+response_cache = ResponseCache(
+    ttl=float(os.environ.get('FEED_CACHE_TTL', '30')),
+    max_entries=int(os.environ.get('FEED_CACHE_MAX_ENTRIES', '256'))
+)
+
+@traced('tiktok-import')
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Business: Import TikTok videos with moderation, categories, and TikTok API integration
@@ -15,122 +75,350 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     method: str = event.get('httpMethod', 'GET')
     
+    if is_timer_trigger(event):
+        return {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/json'},
+            'isBase64Encoded': False,
+            'body': json.dumps(run_scheduled_jobs())
+        }
+    
     if method == 'OPTIONS':
         return {
             'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id',
-                'Access-Control-Max-Age': '86400'
-            },
+            'headers': PREFLIGHT_HEADERS,
             'body': ''
         }
     
     headers = event.get('headers', {})
     user_id = headers.get('X-User-Id') or headers.get('x-user-id', 'anonymous')
     
-    dsn = os.environ.get('DATABASE_URL')
-    conn = psycopg2.connect(dsn)
+    cache_key = None
+    if method == 'GET':
+        cache_key = feed_cache_key(event.get('queryStringParameters') or {})
+        with span('cache.get') as cache_span:
+            cached = response_cache.get(cache_key) if cache_key else None
+            cache_span.tag(hit=cached is not None)
+        if cached is not None:
+            cached_body, cached_etag = cached
+            return conditional_response(cached_body, cached_etag, headers, {'X-Cache': 'HIT'})
+    
+    pool = get_pool()
+    conn = pool.getconn()
     
     try:
         if method == 'GET':
             query_params = event.get('queryStringParameters') or {}
             action = query_params.get('action', 'approved')
             
+            if action == 'pool_stats':
+                return {
+                    'statusCode': 200,
+                    'headers': JSON_HEADERS,
+                    'isBase64Encoded': False,
+                    'body': json.dumps({'pool': pool.stats()})
+                }
+            
+            if action == 'cache_stats':
+                return {
+                    'statusCode': 200,
+                    'headers': JSON_HEADERS,
+                    'isBase64Encoded': False,
+                    'body': json.dumps({
+                        'cache': response_cache.stats(),
+                        'tiktok_api': tiktok_api_stats()
+                    })
+                }
+            
+            if action == 'export':
+                try:
+                    filters = parse_export_filters(query_params)
+                    page_rows = max(1, min(int(query_params.get('limit') or EXPORT_PAGE_ROWS), MAX_EXPORT_PAGE_ROWS))
+                except ValueError as e:
+                    return {
+                        'statusCode': 400,
+                        'headers': JSON_HEADERS,
+                        'isBase64Encoded': False,
+                        'body': json.dumps({'error': str(e)})
+                    }
+                
+                out = io.StringIO()
+                exported = export_ndjson(conn, out, filters, EXPORT_CHUNK_SIZE, page_rows)
+                export_headers = {
+                    'Content-Type': 'application/x-ndjson',
+                    'Access-Control-Allow-Origin': '*',
+                    'Access-Control-Expose-Headers': 'X-Next-After',
+                    'X-Exported': str(exported['exported'])
+                }
+                # A full page means there may be more: resume with ?after=<X-Next-After>
+                if exported['exported'] >= page_rows and exported['last_id'] is not None:
+                    export_headers['X-Next-After'] = str(exported['last_id'])
+                return {
+                    'statusCode': 200,
+                    'headers': export_headers,
+                    'isBase64Encoded': False,
+                    'body': out.getvalue()
+                }
+            
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
                 if action == 'categories':
                     cur.execute("SELECT * FROM video_categories ORDER BY name")
                     categories = cur.fetchall()
-                    return {
-                        'statusCode': 200,
-                        'headers': {
-                            'Content-Type': 'application/json',
-                            'Access-Control-Allow-Origin': '*'
-                        },
-                        'isBase64Encoded': False,
-                        'body': json.dumps({'categories': [dict(c) for c in categories]}, default=str)
-                    }
+                    body = json.dumps({'categories': [dict(c) for c in categories]}, default=str)
+                    etag = compute_etag(body)
+                    response_cache.set(cache_key, (body, etag))
+                    return conditional_response(body, etag, headers, {'X-Cache': 'MISS'})
                 
                 elif action == 'pending':
-                    cur.execute(
-                        """
-                        SELECT id, tiktok_url, video_url, author, author_avatar, 
-                               description, likes, comments, shares, views, 
-                               hashtags, category, moderation_status, created_at
-                        FROM tiktok_videos 
-                        WHERE is_active = TRUE AND moderation_status = 'pending'
-                        ORDER BY created_at DESC
-                        """
-                    )
+                    try:
+                        page_size = parse_page_size(query_params.get('limit'))
+                        cursor_key = decode_cursor(query_params.get('cursor'))
+                    except ValueError as e:
+                        return {
+                            'statusCode': 400,
+                            'headers': JSON_HEADERS,
+                            'isBase64Encoded': False,
+                            'body': json.dumps({'error': str(e)})
+                        }
+                    videos = fetch_pending_page(cur, page_size, cursor_key)
+                    next_cursor = None
+                    if len(videos) > page_size:
+                        videos = videos[:page_size]
+                        next_cursor = encode_cursor(videos[-1]['created_at'], videos[-1]['id'])
+                elif action == 'ranked':
+                    try:
+                        page_size = parse_page_size(query_params.get('limit'))
+                        exclude_ids = parse_id_list(query_params.get('exclude'), MAX_RANKED_EXCLUDE)
+                    except ValueError as e:
+                        return {
+                            'statusCode': 400,
+                            'headers': JSON_HEADERS,
+                            'isBase64Encoded': False,
+                            'body': json.dumps({'error': str(e)})
+                        }
+                    videos = fetch_ranked_feed(cur, user_id, page_size, exclude_ids,
+                                               affinity_weight=RANKED_AFFINITY_WEIGHT)
+                    next_cursor = None
+                elif action == 'search':
+                    text = (query_params.get('q') or '').strip()
+                    tags = normalize_tags(query_params.get('tag'))
+                    try:
+                        if not text and not tags:
+                            raise ValueError('q or tag is required')
+                        page_size = parse_page_size(query_params.get('limit'))
+                        videos, next_cursor = search_videos(cur, text, tags, page_size, query_params.get('cursor'))
+                    except ValueError as e:
+                        return {
+                            'statusCode': 400,
+                            'headers': JSON_HEADERS,
+                            'isBase64Encoded': False,
+                            'body': json.dumps({'error': str(e)})
+                        }
                 else:
-                    category_filter = query_params.get('category')
-                    if category_filter:
-                        cur.execute(
-                            """
-                            SELECT id, tiktok_url, video_url, author, author_avatar, 
-                                   description, likes, comments, shares, views, 
-                                   hashtags, category, created_at
-                            FROM tiktok_videos 
-                            WHERE is_active = TRUE AND moderation_status = 'approved' AND category = %s
-                            ORDER BY created_at DESC
-                            LIMIT 50
-                            """,
-                            (category_filter,)
-                        )
+                    try:
+                        page_size = parse_page_size(query_params.get('limit'))
+                        cursor_key = decode_cursor(query_params.get('cursor'))
+                        fields = parse_fields(query_params.get('fields'))
+                        shape = parse_shape(query_params.get('shape'))
+                    except ValueError as e:
+                        return {
+                            'statusCode': 400,
+                            'headers': JSON_HEADERS,
+                            'isBase64Encoded': False,
+                            'body': json.dumps({'error': str(e)})
+                        }
+                    
+                    snapshot = None
+                    if page_size == DEFAULT_PAGE_SIZE and fields == FEED_FIELDS and shape == 'rows':
+                        snapshot = read_feed_snapshot(conn, query_params.get('category'), query_params.get('cursor'), page_size)
+                    if snapshot is not None:
+                        body, etag = snapshot
                     else:
-                        cur.execute(
-                            """
-                            SELECT id, tiktok_url, video_url, author, author_avatar, 
-                                   description, likes, comments, shares, views, 
-                                   hashtags, category, created_at
-                            FROM tiktok_videos 
-                            WHERE is_active = TRUE AND moderation_status = 'approved'
-                            ORDER BY created_at DESC
-                            LIMIT 50
-                            """
-                        )
+                        body = fetch_feed_page(conn, query_params.get('category'), cursor_key, page_size, fields, shape)
+                        etag = compute_etag(body)
+                    if cache_key:
+                        response_cache.set(cache_key, (body, etag))
+                    
+                    source = 'SNAPSHOT' if snapshot is not None else 'MISS' if cache_key else 'BYPASS'
+                    return conditional_response(body, etag, headers, {'X-Cache': source})
                 
-                videos = cur.fetchall()
+                with span('serialize', rows=len(videos)):
+                    body = json.dumps({
+                        'videos': [dict(v) for v in videos],
+                        'next_cursor': next_cursor
+                    }, default=str)
+                etag = compute_etag(body)
                 
+                return conditional_response(body, etag, headers, {'X-Cache': 'BYPASS'})
+        
+        elif method == 'POST':
+            if (event.get('queryStringParameters') or {}).get('action') == 'import':
+                raw_body = event.get('body') or ''
+                if event.get('isBase64Encoded'):
+                    raw_body = base64.b64decode(raw_body).decode('utf-8')
+                try:
+                    imported = import_ndjson(conn, io.StringIO(raw_body))
+                except psycopg2.DataError as e:
+                    conn.rollback()
+                    return {
+                        'statusCode': 400,
+                        'headers': JSON_HEADERS,
+                        'isBase64Encoded': False,
+                        'body': json.dumps({'error': f'Invalid NDJSON: {e.pgerror or e}'})
+                    }
+                response_cache.clear()
                 return {
                     'statusCode': 200,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*'
-                    },
+                    'headers': JSON_HEADERS,
                     'isBase64Encoded': False,
-                    'body': json.dumps({
-                        'videos': [dict(v) for v in videos]
-                    }, default=str)
+                    'body': json.dumps({'success': True, **imported})
                 }
-        
-        elif method == 'POST':
+            
             body_data = json.loads(event.get('body', '{}'))
             tiktok_url = body_data.get('tiktok_url', '').strip()
             category = body_data.get('category', 'general')
             
+            if body_data.get('action') == 'refresh_stats':
+                refreshed = run_stats_refresh(conn)
+                if refreshed.get('updated'):
+                    # Engagement counts are part of the snapshotted pages
+                    refreshed['snapshots'] = refresh_all_feed_snapshots(conn)
+                return {
+                    'statusCode': 200,
+                    'headers': JSON_HEADERS,
+                    'isBase64Encoded': False,
+                    'body': json.dumps(refreshed)
+                }
+            
+            if body_data.get('action') == 'claim':
+                try:
+                    claim_size = parse_page_size(str(body_data.get('limit', MODERATION_CLAIM_SIZE)))
+                    lease_seconds = int(body_data.get('lease_seconds', MODERATION_LEASE_SECONDS))
+                except (TypeError, ValueError):
+                    return {
+                        'statusCode': 400,
+                        'headers': JSON_HEADERS,
+                        'isBase64Encoded': False,
+                        'body': json.dumps({'error': 'limit and lease_seconds must be positive integers'})
+                    }
+                
+                with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                    claimed = claim_pending(cur, user_id, claim_size, max(30, min(lease_seconds, 3600)))
+                conn.commit()
+                
+                return {
+                    'statusCode': 200,
+                    'headers': JSON_HEADERS,
+                    'isBase64Encoded': False,
+                    'body': json.dumps({'success': True, 'videos': [dict(v) for v in claimed]}, default=str)
+                }
+            
+            if body_data.get('action') == 'backfill_search':
+                return {
+                    'statusCode': 200,
+                    'headers': JSON_HEADERS,
+                    'isBase64Encoded': False,
+                    'body': json.dumps({'success': True, **backfill_search_vectors(conn)})
+                }
+            
+            if body_data.get('action') == 'archive':
+                return {
+                    'statusCode': 200,
+                    'headers': JSON_HEADERS,
+                    'isBase64Encoded': False,
+                    'body': json.dumps({'success': True, **run_archive(conn)})
+                }
+            
+            if body_data.get('action') == 'restore':
+                video_ids = body_data.get('video_ids')
+                try:
+                    if not isinstance(video_ids, list) or not video_ids or len(video_ids) > MAX_RESTORE_IDS:
+                        raise ValueError
+                    video_ids = [int(v) for v in video_ids]
+                except (TypeError, ValueError):
+                    return {
+                        'statusCode': 400,
+                        'headers': JSON_HEADERS,
+                        'isBase64Encoded': False,
+                        'body': json.dumps({'error': f'video_ids must be a list of 1 to {MAX_RESTORE_IDS} integer ids'})
+                    }
+                restored = restore_videos(conn, video_ids)
+                return {
+                    'statusCode': 200,
+                    'headers': JSON_HEADERS,
+                    'isBase64Encoded': False,
+                    'body': json.dumps({
+                        'success': True,
+                        'restored': restored,
+                        'not_restored': sorted(set(video_ids) - set(restored))
+                    })
+                }
+            
+            if body_data.get('action') == 'rebuild_snapshots':
+                return {
+                    'statusCode': 200,
+                    'headers': JSON_HEADERS,
+                    'isBase64Encoded': False,
+                    'body': json.dumps({
+                        'success': True,
+                        **rebuild_all_feed_snapshots(conn, DEFAULT_PAGE_SIZE, FEED_SNAPSHOT_PAGES, compute_etag)
+                    })
+                }
+            
+            if body_data.get('action') == 'refresh_scores':
+                return {
+                    'statusCode': 200,
+                    'headers': JSON_HEADERS,
+                    'isBase64Encoded': False,
+                    'body': json.dumps({'success': True, **refresh_video_scores(conn)})
+                }
+            
+            tiktok_urls = body_data.get('tiktok_urls')
+            if tiktok_urls is not None:
+                if not isinstance(tiktok_urls, list) or not tiktok_urls:
+                    return {
+                        'statusCode': 400,
+                        'headers': JSON_HEADERS,
+                        'isBase64Encoded': False,
+                        'body': json.dumps({'error': 'tiktok_urls must be a non-empty list'})
+                    }
+                if len(tiktok_urls) > MAX_BATCH_IMPORT:
+                    return {
+                        'statusCode': 400,
+                        'headers': JSON_HEADERS,
+                        'isBase64Encoded': False,
+                        'body': json.dumps({'error': f'At most {MAX_BATCH_IMPORT} URLs per batch'})
+                    }
+                
+                results = import_videos_batch(conn, tiktok_urls, category, user_id)
+                response_cache.clear()
+                imported = sum(1 for r in results if r['success'])
+                
+                return {
+                    'statusCode': 200,
+                    'headers': JSON_HEADERS,
+                    'isBase64Encoded': False,
+                    'body': json.dumps({
+                        'success': imported > 0,
+                        'message': f'{imported} of {len(results)} videos added to moderation queue',
+                        'results': results
+                    })
+                }
+            
             if not tiktok_url:
                 return {
                     'statusCode': 400,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*'
-                    },
+                    'headers': JSON_HEADERS,
                     'isBase64Encoded': False,
                     'body': json.dumps({'error': 'TikTok URL is required'})
                 }
             
-            client_key = os.environ.get('TIKTOK_CLIENT_KEY')
-            video_data = parse_tiktok_with_api(tiktok_url, client_key) if client_key else parse_tiktok_url(tiktok_url)
+            video_data = fetch_video_data(tiktok_url)
             
             if not video_data:
                 return {
                     'statusCode': 400,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*'
-                    },
+                    'headers': JSON_HEADERS,
                     'isBase64Encoded': False,
                     'body': json.dumps({'error': 'Invalid TikTok URL or unable to fetch video'})
                 }
@@ -172,13 +460,11 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 )
                 video_id = cur.fetchone()[0]
                 conn.commit()
+                response_cache.clear()
                 
                 return {
                     'statusCode': 200,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*'
-                    },
+                    'headers': JSON_HEADERS,
                     'isBase64Encoded': False,
                     'body': json.dumps({
                         'success': True,
@@ -193,46 +479,90 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             video_id = body_data.get('video_id')
             action = body_data.get('action')
             
+            if 'decisions' in body_data:
+                try:
+                    decisions = parse_decisions(body_data.get('decisions'), MAX_BULK_DECISIONS)
+                except ValueError as e:
+                    return {
+                        'statusCode': 400,
+                        'headers': JSON_HEADERS,
+                        'isBase64Encoded': False,
+                        'body': json.dumps({'error': str(e)})
+                    }
+                
+                with conn.cursor() as cur:
+                    visible_before = visible_categories(cur, [d[0] for d in decisions])
+                    applied_ids = apply_decisions(cur, user_id, decisions)
+                    sync_video_scores(cur, applied_ids)
+                    refresh_feed_snapshots(conn, cur, applied_ids, visible_before)
+                conn.commit()
+                response_cache.clear()
+                
+                skipped_ids = sorted({d[0] for d in decisions} - set(applied_ids))
+                return {
+                    'statusCode': 200,
+                    'headers': JSON_HEADERS,
+                    'isBase64Encoded': False,
+                    'body': json.dumps({
+                        'success': True,
+                        'message': f'{len(applied_ids)} of {len(decisions)} decisions applied',
+                        'applied': sorted(applied_ids),
+                        'skipped': skipped_ids
+                    })
+                }
+            
             if not video_id or not action:
                 return {
                     'statusCode': 400,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*'
-                    },
+                    'headers': JSON_HEADERS,
                     'isBase64Encoded': False,
                     'body': json.dumps({'error': 'Video ID and action are required'})
                 }
             
+            try:
+                decisions = parse_decisions([{
+                    'video_id': video_id,
+                    'action': action,
+                    'category': body_data.get('category') if action == 'update_category' else None
+                }], 1)
+            except ValueError as e:
+                return {
+                    'statusCode': 400,
+                    'headers': JSON_HEADERS,
+                    'isBase64Encoded': False,
+                    'body': json.dumps({'error': str(e)})
+                }
+            video_id = decisions[0][0]
+            
+            # Same lease rules as bulk decisions: a video leased to another moderator is left untouched
             with conn.cursor() as cur:
-                if action == 'approve':
-                    cur.execute(
-                        """UPDATE tiktok_videos 
-                           SET moderation_status = 'approved', moderated_by = %s, moderated_at = CURRENT_TIMESTAMP 
-                           WHERE id = %s""",
-                        (user_id, video_id)
-                    )
-                elif action == 'reject':
-                    cur.execute(
-                        """UPDATE tiktok_videos 
-                           SET moderation_status = 'rejected', moderated_by = %s, moderated_at = CURRENT_TIMESTAMP, is_active = FALSE 
-                           WHERE id = %s""",
-                        (user_id, video_id)
-                    )
-                elif action == 'update_category':
-                    category = body_data.get('category', 'general')
-                    cur.execute(
-                        "UPDATE tiktok_videos SET category = %s, updated_at = CURRENT_TIMESTAMP WHERE id = %s",
-                        (category, video_id)
-                    )
+                visible_before = visible_categories(cur, [video_id])
+                applied_ids = apply_decisions(cur, user_id, decisions)
+                if not applied_ids:
+                    cur.execute("SELECT claimed_by FROM tiktok_videos WHERE id = %s", (video_id,))
+                    row = cur.fetchone()
+                    conn.rollback()
+                    if row is None:
+                        return {
+                            'statusCode': 404,
+                            'headers': JSON_HEADERS,
+                            'isBase64Encoded': False,
+                            'body': json.dumps({'error': 'Video not found'})
+                        }
+                    return {
+                        'statusCode': 409,
+                        'headers': JSON_HEADERS,
+                        'isBase64Encoded': False,
+                        'body': json.dumps({'error': 'Video is claimed by another moderator', 'claimed_by': row[0]})
+                    }
+                sync_video_scores(cur, applied_ids)
+                refresh_feed_snapshots(conn, cur, applied_ids, visible_before)
                 conn.commit()
+                response_cache.clear()
                 
                 return {
                     'statusCode': 200,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*'
-                    },
+                    'headers': JSON_HEADERS,
                     'isBase64Encoded': False,
                     'body': json.dumps({'success': True, 'message': f'Video {action} successfully'})
                 }
@@ -244,27 +574,25 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             if not video_id:
                 return {
                     'statusCode': 400,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*'
-                    },
+                    'headers': JSON_HEADERS,
                     'isBase64Encoded': False,
                     'body': json.dumps({'error': 'Video ID is required'})
                 }
             
             with conn.cursor() as cur:
+                visible_before = visible_categories(cur, [video_id])
                 cur.execute(
-                    "UPDATE tiktok_videos SET is_active = FALSE WHERE id = %s",
+                    "UPDATE tiktok_videos SET is_active = FALSE, updated_at = CURRENT_TIMESTAMP WHERE id = %s",
                     (video_id,)
                 )
+                sync_video_score(cur, video_id)
+                refresh_feed_snapshots(conn, cur, [video_id], visible_before)
                 conn.commit()
+                response_cache.clear()
                 
                 return {
                     'statusCode': 200,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*'
-                    },
+                    'headers': JSON_HEADERS,
                     'isBase64Encoded': False,
                     'body': json.dumps({
                         'success': True,
@@ -280,65 +608,257 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         }
     
     finally:
-        conn.close()
+        pool.putconn(conn)
 
 
-def parse_tiktok_with_api(url: str, client_key: str) -> Optional[Dict[str, Any]]:
+def tiktok_api_stats() -> Dict[str, Any]:
+    '''Client counters, without importing the client (and requests) only to report that it is unused'''
+    module = sys.modules.get('tiktok_client')
+    return module.tiktok_client_stats() if module else {}
+
+
+def fetch_video_data(url: str) -> Optional[Dict[str, Any]]:
+    '''Resolve metadata through the TikTok API when configured, URL parsing otherwise'''
+    client_key = os.environ.get('TIKTOK_CLIENT_KEY')
+    return parse_tiktok_with_api(url, client_key) if client_key else parse_tiktok_url(url)
+
+
+def is_timer_trigger(event: Dict[str, Any]) -> bool:
+    '''Scheduled invocations arrive as trigger messages instead of HTTP events'''
+    messages = event.get('messages')
+    if 'httpMethod' in event or not isinstance(messages, list) or not messages:
+        return False
+    event_type = (messages[0].get('event_metadata') or {}).get('event_type', '')
+    return event_type.endswith('TimerMessage')
+
+
+def run_stats_refresh(conn: Any = None) -> Dict[str, Any]:
     '''
-    Parse TikTok URL using official TikTok API
-    Requires TIKTOK_CLIENT_KEY to be configured
+    One budgeted pass of the engagement-stats refresher
+    Safe to call repeatedly: every pass continues from the stalest approved videos
+    '''
+    client_key = os.environ.get('TIKTOK_CLIENT_KEY')
+    if not client_key:
+        return {'success': False, 'error': 'TIKTOK_CLIENT_KEY is not configured'}
+    
+    from stats_refresh import refresh_engagement_stats
+    
+    pool = get_pool()
+    own_conn = conn is None
+    if own_conn:
+        conn = pool.getconn()
+    try:
+        result = refresh_engagement_stats(
+            conn,
+            lambda url: fetch_tiktok_api_data(url, client_key, fresh=True),
+            time_budget=float(os.environ.get('STATS_REFRESH_TIME_BUDGET', '20')),
+            max_videos=int(os.environ.get('STATS_REFRESH_MAX_VIDEOS', '500')),
+            batch_size=int(os.environ.get('STATS_REFRESH_BATCH_SIZE', '50')),
+            workers=int(os.environ.get('STATS_REFRESH_WORKERS', '8'))
+        )
+    finally:
+        if own_conn:
+            pool.putconn(conn)
+    
+    if result['updated']:
+        response_cache.clear()
+    return {'success': True, **result}
+
+
+def run_scheduled_jobs() -> Dict[str, Any]:
+    '''Work done on each timer tick: refresh stats, fold changes into ranking scores, backfill search, rebuild snapshots, archive'''
+    pool = get_pool()
+    conn = pool.getconn()
+    try:
+        stats = run_stats_refresh(conn)
+        scores = refresh_video_scores(conn)
+        search = backfill_search_vectors(conn, time_budget=5.0)
+        # Also picks up engagement and counter changes, which do not trigger a rebuild on their own
+        snapshots = refresh_all_feed_snapshots(conn)
+        archived = run_archive(conn, time_budget=5.0)
+    finally:
+        pool.putconn(conn)
+    return {'stats': stats, 'scores': scores, 'search': search, 'snapshots': snapshots, 'archive': archived}
+
+
+def run_archive(conn: Any, time_budget: float = 10.0) -> Dict[str, Any]:
+    '''One budgeted archival pass over videos inactive for longer than ARCHIVE_VIDEO_AFTER_DAYS'''
+    return archive_inactive_videos(conn, ARCHIVE_VIDEO_AFTER_DAYS, ARCHIVE_BATCH_SIZE, time_budget)
+
+
+def refresh_all_feed_snapshots(conn: Any) -> Dict[str, Any]:
+    '''Rebuild every feed snapshot; on failure log it and leave the previous snapshots in place'''
+    try:
+        return rebuild_all_feed_snapshots(conn, DEFAULT_PAGE_SIZE, FEED_SNAPSHOT_PAGES, compute_etag)
+    except Exception as e:
+        conn.rollback()
+        print(f'Feed snapshot rebuild error: {e}')
+        return {'error': str(e)}
+
+
+def refresh_feed_snapshots(conn: Any, cur: Any, video_ids: List[Any], visible_before: Set[str]) -> None:
     '''
+    Rebuild the snapshots of every feed a moderation write could have changed:
+    categories the videos were visible in before the write or are visible in now, plus the unfiltered feed
+    '''
+    affected = visible_before | visible_categories(cur, video_ids)
+    if not affected:
+        return
+    feeds = list(affected) + [None]
+    # The snapshots are a derived cache: a failed rebuild must not roll back the moderation write,
+    # so it runs under a savepoint and falls back to dropping the affected snapshots
+    cur.execute("SAVEPOINT feed_snapshots")
     try:
-        video_id_match = re.search(r'/video/(\d+)', url)
+        rebuild_feed_snapshots(conn, feeds, DEFAULT_PAGE_SIZE, FEED_SNAPSHOT_PAGES, compute_etag)
+    except Exception as e:
+        print(f'Feed snapshot rebuild error: {e}')
+        cur.execute("ROLLBACK TO SAVEPOINT feed_snapshots")
+        drop_feed_snapshots(cur, feeds)
+    cur.execute("RELEASE SAVEPOINT feed_snapshots")
+
+
+def import_videos_batch(conn: Any, urls: List[Any], category: str, user_id: str) -> List[Dict[str, Any]]:
+    '''
+    Import many TikTok URLs at once
+    Dedupes by TikTok video id, fetches metadata concurrently and writes one bulk upsert
+    Returns one result per input URL, in input order
+    '''
+    results: List[Dict[str, Any]] = []
+    first_url_by_video: Dict[str, str] = {}
+    for raw_url in urls:
+        url = raw_url.strip() if isinstance(raw_url, str) else ''
+        video_id_match = TIKTOK_VIDEO_ID_RE.search(url)
         if not video_id_match:
-            return parse_tiktok_url(url)
-        
-        video_id = video_id_match.group(1)
-        
-        response = requests.get(
-            'https://open.tiktokapis.com/v2/video/query/',
-            headers={
-                'Authorization': f'Bearer {client_key}',
-                'Content-Type': 'application/json'
-            },
-            params={'video_id': video_id},
-            timeout=10
+            results.append({'tiktok_url': raw_url, 'success': False, 'error': 'Invalid TikTok URL'})
+            continue
+        canonical_url = first_url_by_video.setdefault(video_id_match.group(1), url)
+        results.append({'tiktok_url': url, 'success': False, 'canonical_url': canonical_url})
+    
+    unique_urls = list(first_url_by_video.values())
+    fetched: Dict[str, Optional[Dict[str, Any]]] = {}
+    if unique_urls:
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=max(1, min(IMPORT_FETCH_WORKERS, len(unique_urls)))) as executor:
+            fetched = dict(zip(unique_urls, executor.map(propagate(fetch_video_data), unique_urls)))
+    
+    rows = [
+        (
+            url,
+            video_data['video_url'],
+            video_data['author'],
+            video_data.get('author_avatar'),
+            video_data['description'],
+            video_data.get('likes', 0),
+            video_data.get('comments', 0),
+            video_data.get('shares', 0),
+            video_data.get('views', 0),
+            video_data.get('hashtags', []),
+            category,
+            user_id,
+            'pending'
         )
-        
-        if response.status_code == 200:
-            data = response.json()
-            video_info = data.get('data', {}).get('video', {})
-            
-            return {
-                'video_url': f'https://www.tiktok.com/embed/v2/{video_id}',
-                'author': extract_username_from_url(url),
-                'author_avatar': video_info.get('author_avatar_url'),
-                'description': video_info.get('description', f'TikTok видео #{video_id}'),
-                'likes': video_info.get('like_count', 0),
-                'comments': video_info.get('comment_count', 0),
-                'shares': video_info.get('share_count', 0),
-                'views': video_info.get('view_count', 0),
-                'hashtags': extract_hashtags(video_info.get('description', ''))
-            }
+        for url, video_data in fetched.items() if video_data
+    ]
+    
+    ids_by_url: Dict[str, int] = {}
+    if rows:
+        with conn.cursor() as cur:
+            returned = execute_values(
+                cur,
+                """
+                INSERT INTO tiktok_videos
+                (tiktok_url, video_url, author, author_avatar, description,
+                 likes, comments, shares, views, hashtags, category, added_by, moderation_status)
+                VALUES %s
+                ON CONFLICT (tiktok_url)
+                DO UPDATE SET
+                    video_url = EXCLUDED.video_url,
+                    description = EXCLUDED.description,
+                    likes = EXCLUDED.likes,
+                    comments = EXCLUDED.comments,
+                    shares = EXCLUDED.shares,
+                    views = EXCLUDED.views,
+                    hashtags = EXCLUDED.hashtags,
+                    category = EXCLUDED.category,
+                    updated_at = CURRENT_TIMESTAMP
+                RETURNING id, tiktok_url
+                """,
+                rows,
+                page_size=len(rows),
+                fetch=True
+            )
+            ids_by_url = {url: video_id for video_id, url in returned}
+        conn.commit()
+    
+    for result in results:
+        canonical_url = result.pop('canonical_url', None)
+        if canonical_url is None:
+            continue
+        if canonical_url in ids_by_url:
+            result['success'] = True
+            result['video_id'] = ids_by_url[canonical_url]
+            if canonical_url != result['tiktok_url']:
+                result['duplicate_of'] = canonical_url
         else:
-            return parse_tiktok_url(url)
+            result['error'] = 'Unable to fetch video'
+    return results
+
+
+def parse_tiktok_with_api(url: str, client_key: str) -> Optional[Dict[str, Any]]:
+    '''
+    Parse TikTok URL using official TikTok API
+    Requires TIKTOK_CLIENT_KEY to be configured
+    '''
+    try:
+        video_data = fetch_tiktok_api_data(url, client_key)
+        return video_data if video_data else parse_tiktok_url(url)
     except Exception as e:
         print(f'TikTok API error: {e}')
         return parse_tiktok_url(url)
 
 
+def fetch_tiktok_api_data(url: str, client_key: str, fresh: bool = False) -> Optional[Dict[str, Any]]:
+    '''
+    Video data from the TikTok API only, without the URL-parsing fallback
+    Returns None when the API has nothing, so callers can tell real stats from placeholders
+    '''
+    video_id_match = TIKTOK_VIDEO_ID_RE.search(url)
+    if not video_id_match:
+        return None
+    
+    video_id = video_id_match.group(1)
+    
+    # Deferred so feed-only cold starts never import requests
+    from tiktok_client import get_tiktok_client
+    video_info = get_tiktok_client(client_key).fetch_video(video_id, fresh=fresh)
+    if video_info is None:
+        return None
+    
+    return {
+        'video_url': f'https://www.tiktok.com/embed/v2/{video_id}',
+        'author': extract_username_from_url(url),
+        'author_avatar': video_info.get('author_avatar_url'),
+        'description': video_info.get('description', f'TikTok видео #{video_id}'),
+        'likes': video_info.get('like_count', 0),
+        'comments': video_info.get('comment_count', 0),
+        'shares': video_info.get('share_count', 0),
+        'views': video_info.get('view_count', 0),
+        'hashtags': extract_hashtags(video_info.get('description', ''))
+    }
+
+
 def parse_tiktok_url(url: str) -> Optional[Dict[str, Any]]:
     '''
     Parse TikTok URL - fallback method without API
     Returns basic structure with embedded TikTok video
     '''
-    video_id_match = re.search(r'/video/(\d+)', url)
+    video_id_match = TIKTOK_VIDEO_ID_RE.search(url)
     if not video_id_match:
         return None
     
     video_id = video_id_match.group(1)
     
-    hashtags_match = re.findall(r'#(\w+)', url)
+    hashtags_match = HASHTAG_RE.findall(url)
     
     return {
         'video_url': f'https://www.tiktok.com/embed/v2/{video_id}',
@@ -355,7 +875,7 @@ def parse_tiktok_url(url: str) -> Optional[Dict[str, Any]]:
 
 def extract_username_from_url(url: str) -> str:
     '''Extract TikTok username from URL'''
-    username_match = re.search(r'@([a-zA-Z0-9._]+)', url)
+    username_match = TIKTOK_USERNAME_RE.search(url)
     if username_match:
         return f"@{username_match.group(1)}"
     return '@tiktok_user'
@@ -363,5 +883,85 @@ def extract_username_from_url(url: str) -> str:
 
 def extract_hashtags(text: str) -> list:
     '''Extract hashtags from text'''
-    hashtags = re.findall(r'#(\w+)', text)
-    return hashtags if hashtags else ['tiktok']
\ No newline at end of file
+    hashtags = HASHTAG_RE.findall(text)
+    return hashtags if hashtags else ['tiktok']
+
+
+def parse_page_size(raw: Optional[str]) -> int:
+    '''Validate the limit query parameter against the configured bounds'''
+    if raw is None or raw == '':
+        return DEFAULT_PAGE_SIZE
+    try:
+        size = int(raw)
+    except (TypeError, ValueError):
+        raise ValueError('limit must be an integer')
+    if size < 1:
+        raise ValueError('limit must be positive')
+    return min(size, MAX_PAGE_SIZE)
+
+
+def parse_id_list(raw: Optional[str], max_items: int) -> List[int]:
+    '''Comma-separated integer ids from a query parameter'''
+    if not raw:
+        return []
+    try:
+        ids = [int(part) for part in raw.split(',') if part.strip()]
+    except ValueError:
+        raise ValueError('ids must be comma-separated integers')
+    return ids[:max_items]
+
+
+
+def feed_cache_key(query_params: Dict[str, Any]) -> Optional[Tuple]:
+    '''Cache key for cacheable GET actions; None means the request must hit the database'''
+    action = query_params.get('action', 'approved')
+    if action == 'categories':
+        return ('categories',)
+    if action == 'approved':
+        return (
+            'approved',
+            query_params.get('category') or None,
+            query_params.get('cursor') or None,
+            query_params.get('limit') or None,
+            query_params.get('fields') or None,
+            query_params.get('shape') or None
+        )
+    return None
+
+
+def compute_etag(body: str) -> str:
+    '''Strong validator derived from the serialized body'''
+    return '"' + hashlib.sha1(body.encode('utf-8')).hexdigest()[:20] + '"'
+
+
+def etag_matches(request_headers: Dict[str, Any], etag: str) -> bool:
+    '''Check If-None-Match (any casing, comma lists, weak tags, *) against etag'''
+    header = request_headers.get('If-None-Match') or request_headers.get('if-none-match')
+    if not header:
+        return False
+    for candidate in header.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == '*' or candidate == etag:
+            return True
+    return False
+
+
+def conditional_response(body: str, etag: str, request_headers: Dict[str, Any],
+                         extra_headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    '''200 with body and ETag, or an empty 304 when the client already has this version'''
+    response_headers = {**CONDITIONAL_HEADERS, 'ETag': etag, **(extra_headers or {})}
+    if etag_matches(request_headers, etag):
+        return {
+            'statusCode': 304,
+            'headers': response_headers,
+            'isBase64Encoded': False,
+            'body': ''
+        }
+    return {
+        'statusCode': 200,
+        'headers': {'Content-Type': 'application/json', **response_headers},
+        'isBase64Encoded': False,
+        'body': body
+    }
@@ -0,0 +1,119 @@
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+from psycopg2.extras import execute_values
+
+PENDING_COLUMNS = """
+    id, tiktok_url, video_url, author, author_avatar,
+    description, likes, comments, shares, views,
+    hashtags, category, moderation_status, created_at,
+    claimed_by, claim_expires_at
+"""
+
+DECISION_ACTIONS = ('approve', 'reject', 'update_category')
+
+
+def fetch_pending_page(cur: Any, page_size: int,
+                       cursor_key: Optional[Tuple[datetime, int]]) -> List[Dict[str, Any]]:
+    '''One keyset page of the pending queue, newest first, read through the partial queue index'''
+    conditions = ["is_active = TRUE", "moderation_status = 'pending'"]
+    params: list = []
+    if cursor_key:
+        conditions.append("(created_at, id) < (%s, %s)")
+        params.extend(cursor_key)
+    params.append(page_size + 1)
+    cur.execute(
+        f"""
+        SELECT {PENDING_COLUMNS}
+        FROM tiktok_videos
+        WHERE {' AND '.join(conditions)}
+        ORDER BY created_at DESC, id DESC
+        LIMIT %s
+        """,
+        params
+    )
+    return cur.fetchall()
+
+
+def claim_pending(cur: Any, moderator: str, limit: int, lease_seconds: int) -> List[Dict[str, Any]]:
+    '''
+    Atomically lease up to limit unclaimed pending videos, oldest first
+    Expired leases and the moderator's own leases are claimable again; SKIP LOCKED keeps
+    concurrent claimers from waiting on or double-claiming the same rows
+    '''
+    cur.execute(
+        f"""
+        UPDATE tiktok_videos
+        SET claimed_by = %(moderator)s,
+            claim_expires_at = LOCALTIMESTAMP + make_interval(secs => %(lease)s)
+        WHERE id IN (
+            SELECT id FROM tiktok_videos
+            WHERE is_active = TRUE AND moderation_status = 'pending'
+              AND (claimed_by IS NULL OR claimed_by = %(moderator)s OR claim_expires_at < LOCALTIMESTAMP)
+            ORDER BY created_at ASC, id ASC
+            LIMIT %(limit)s
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING {PENDING_COLUMNS}
+        """,
+        {'moderator': moderator, 'lease': lease_seconds, 'limit': limit}
+    )
+    return sorted(cur.fetchall(), key=lambda row: (row['created_at'], row['id']))
+
+
+def parse_decisions(decisions: Any, max_items: int) -> List[Tuple[int, str, Optional[str]]]:
+    '''Validate bulk decisions; the last decision for a video wins'''
+    if not isinstance(decisions, list) or not decisions:
+        raise ValueError('decisions must be a non-empty list')
+    if len(decisions) > max_items:
+        raise ValueError(f'At most {max_items} decisions per request')
+    by_id: Dict[int, Tuple[int, str, Optional[str]]] = {}
+    for item in decisions:
+        if not isinstance(item, dict):
+            raise ValueError('Each decision must be an object')
+        action = item.get('action')
+        if action not in DECISION_ACTIONS:
+            raise ValueError(f'Unknown action: {action}')
+        try:
+            video_id = int(item.get('video_id'))
+        except (TypeError, ValueError):
+            raise ValueError('Each decision requires an integer video_id')
+        category = item.get('category')
+        if action == 'update_category' and not category:
+            category = 'general'
+        by_id[video_id] = (video_id, action, category)
+    return list(by_id.values())
+
+
+def apply_decisions(cur: Any, moderator: str,
+                    decisions: List[Tuple[int, str, Optional[str]]]) -> List[int]:
+    '''
+    Apply approve/reject/update_category decisions for many videos in one UPDATE
+    Rows leased to another moderator are left untouched; returns the ids that were updated
+    '''
+    # The moderator travels as a VALUES column: execute_values owns the only %s placeholder
+    rows = execute_values(
+        cur,
+        """
+        UPDATE tiktok_videos AS t SET
+            moderation_status = CASE d.action
+                WHEN 'approve' THEN 'approved'
+                WHEN 'reject' THEN 'rejected'
+                ELSE t.moderation_status END,
+            is_active = CASE WHEN d.action = 'reject' THEN FALSE ELSE t.is_active END,
+            category = COALESCE(d.category, t.category),
+            moderated_by = CASE WHEN d.action IN ('approve', 'reject') THEN d.moderator ELSE t.moderated_by END,
+            moderated_at = CASE WHEN d.action IN ('approve', 'reject') THEN CURRENT_TIMESTAMP ELSE t.moderated_at END,
+            updated_at = CASE WHEN d.category IS NOT NULL OR d.action = 'reject' THEN CURRENT_TIMESTAMP ELSE t.updated_at END,
+            claimed_by = NULL,
+            claim_expires_at = NULL
+        FROM (VALUES %s) AS d(id, action, category, moderator)
+        WHERE t.id = d.id
+          AND (t.claimed_by IS NULL OR t.claimed_by = d.moderator OR t.claim_expires_at < LOCALTIMESTAMP)
+        RETURNING t.id
+        """,
+        [(video_id, action, category, moderator) for video_id, action, category in decisions],
+        template='(%s::int, %s::text, %s::varchar, %s::varchar)',
+        page_size=len(decisions),
+        fetch=True
+    )
+    return [row[0] for row in rows]
@@ -0,0 +1,162 @@
+from typing import Dict, Any, List
+
+RANKED_COLUMNS = """
+    t.id, t.tiktok_url, t.video_url, t.author, t.author_avatar,
+    t.description, t.likes, t.comments, t.shares, t.views,
+    t.hashtags, t.category, t.created_at,
+    COALESCE(vc.app_likes, 0) AS app_likes, COALESCE(vc.app_saves, 0) AS app_saves
+"""
+
+# Excludes videos the user already interacted with, including rows the interaction archiver moved out of user_videos
+UNSEEN_FILTER = """NOT EXISTS (
+                      SELECT 1 FROM user_videos uv
+                      WHERE uv.user_id = %(user_id)s AND uv.video_id = s.video_id
+                  )
+                  AND NOT EXISTS (
+                      SELECT 1 FROM user_videos_archive ua
+                      WHERE ua.user_id = %(user_id)s AND ua.video_id = s.video_id
+                  )"""
+
+
+def sync_video_score(cur: Any, video_id: Any) -> None:
+    '''
+    Bring one video's row in video_scores in line with tiktok_videos
+    Called inside moderation writes so approvals, rejections and deletes show up immediately
+    '''
+    sync_video_scores(cur, [video_id])
+
+
+def sync_video_scores(cur: Any, video_ids: List[Any]) -> None:
+    '''Set-based form of sync_video_score for bulk moderation decisions'''
+    if not video_ids:
+        return
+    cur.execute(
+        """
+        INSERT INTO video_scores (video_id, category, score, computed_at)
+        SELECT id, COALESCE(category, 'general'), video_hot_score(likes, comments, shares, views, created_at), CURRENT_TIMESTAMP
+        FROM tiktok_videos
+        WHERE id = ANY(%s::int[]) AND is_active = TRUE AND moderation_status = 'approved'
+        ON CONFLICT (video_id)
+        DO UPDATE SET category = EXCLUDED.category, score = EXCLUDED.score, computed_at = EXCLUDED.computed_at
+        """,
+        (list(video_ids),)
+    )
+    cur.execute(
+        """
+        DELETE FROM video_scores s
+        USING tiktok_videos t
+        WHERE s.video_id = t.id AND t.id = ANY(%s::int[])
+          AND (t.is_active = FALSE OR t.moderation_status <> 'approved')
+        """,
+        (list(video_ids),)
+    )
+
+
+def refresh_video_scores(conn: Any, overlap_seconds: int = 300) -> Dict[str, Any]:
+    '''
+    Incrementally recompute scores for videos changed since the last watermark
+    The overlap window re-reads recent rows so late-committing writes are not missed
+    '''
+    with conn.cursor() as cur:
+        cur.execute("SELECT refreshed_through FROM video_scores_state WHERE id = 1 FOR UPDATE")
+        row = cur.fetchone()
+        cur.execute("SELECT COALESCE(MAX(updated_at), LOCALTIMESTAMP) FROM tiktok_videos")
+        new_watermark = cur.fetchone()[0]
+        since = row[0] if row else None
+
+        changed_filter = "t.updated_at > %s - make_interval(secs => %s)" if since else "TRUE"
+        changed_params = (since, overlap_seconds) if since else ()
+
+        cur.execute(
+            f"""
+            INSERT INTO video_scores (video_id, category, score, computed_at)
+            SELECT t.id, COALESCE(t.category, 'general'),
+                   video_hot_score(t.likes, t.comments, t.shares, t.views, t.created_at), CURRENT_TIMESTAMP
+            FROM tiktok_videos t
+            WHERE {changed_filter} AND t.is_active = TRUE AND t.moderation_status = 'approved'
+            ON CONFLICT (video_id)
+            DO UPDATE SET category = EXCLUDED.category, score = EXCLUDED.score, computed_at = EXCLUDED.computed_at
+            """,
+            changed_params
+        )
+        upserted = cur.rowcount
+
+        cur.execute(
+            f"""
+            DELETE FROM video_scores s
+            USING tiktok_videos t
+            WHERE s.video_id = t.id AND {changed_filter}
+              AND (t.is_active = FALSE OR t.moderation_status <> 'approved')
+            """,
+            changed_params
+        )
+        removed = cur.rowcount
+
+        cur.execute(
+            """
+            INSERT INTO video_scores_state (id, refreshed_through) VALUES (1, %s)
+            ON CONFLICT (id) DO UPDATE SET refreshed_through = EXCLUDED.refreshed_through
+            """,
+            (new_watermark,)
+        )
+    conn.commit()
+    return {'upserted': upserted, 'removed': removed}
+
+
+def fetch_ranked_feed(cur: Any, user_id: str, limit: int, exclude_ids: List[int],
+                      candidates_per_source: int = 200, affinity_weight: float = 2.0) -> List[Dict[str, Any]]:
+    '''
+    Ranked feed for one user from precomputed scores
+    Candidates are bounded index range reads: the global top plus the top of each category
+    the user has liked, skipping anything they already interacted with or passed in exclude_ids
+    Only those candidates are re-weighted by category affinity
+    '''
+    cur.execute(
+        f"""
+        WITH affinity AS (
+            SELECT t.category, COUNT(*)::float / SUM(COUNT(*)) OVER () AS weight
+            FROM user_videos uv
+            JOIN tiktok_videos t ON t.id = uv.video_id
+            WHERE uv.user_id = %(user_id)s AND uv.is_liked = TRUE
+            GROUP BY t.category
+        ),
+        candidates AS (
+            (
+                SELECT s.video_id, s.category, s.score
+                FROM video_scores s
+                WHERE s.video_id <> ALL(%(exclude)s::int[])
+                  AND {UNSEEN_FILTER}
+                ORDER BY s.score DESC, s.video_id DESC
+                LIMIT %(per_source)s
+            )
+            UNION
+            SELECT c.video_id, c.category, c.score
+            FROM affinity a
+            CROSS JOIN LATERAL (
+                SELECT s.video_id, s.category, s.score
+                FROM video_scores s
+                WHERE s.category = a.category
+                  AND s.video_id <> ALL(%(exclude)s::int[])
+                  AND {UNSEEN_FILTER}
+                ORDER BY s.score DESC, s.video_id DESC
+                LIMIT %(per_source)s
+            ) c
+        )
+        SELECT {RANKED_COLUMNS},
+               c.score + COALESCE(a.weight, 0) * %(affinity_weight)s AS rank_score
+        FROM candidates c
+        JOIN tiktok_videos t ON t.id = c.video_id
+        LEFT JOIN affinity a ON a.category = c.category
+        LEFT JOIN video_counters vc ON vc.video_id = c.video_id
+        ORDER BY rank_score DESC, t.id DESC
+        LIMIT %(limit)s
+        """,
+        {
+            'user_id': user_id,
+            'exclude': exclude_ids,
+            'per_source': max(candidates_per_source, limit),
+            'affinity_weight': affinity_weight,
+            'limit': limit
+        }
+    )
+    return cur.fetchall()
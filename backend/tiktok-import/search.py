@@ -0,0 +1,134 @@
+import base64
+import time
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+SEARCH_COLUMNS = """
+    id, tiktok_url, video_url, author, author_avatar,
+    description, likes, comments, shares, views,
+    hashtags, category, created_at
+"""
+
+
+def normalize_tags(raw: Optional[str]) -> List[str]:
+    '''Comma-separated hashtags, with or without the leading #'''
+    if not raw:
+        return []
+    return [tag.strip().lstrip('#') for tag in raw.split(',') if tag.strip().lstrip('#')]
+
+
+def search_videos(cur: Any, text: Optional[str], tags: List[str], page_size: int,
+                  cursor: Optional[str]) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    '''
+    Approved videos matching a full-text query and/or containing all given hashtags
+    Text matches are ordered by ts_rank_cd and paged on (rank, id); tag-only searches
+    are ordered newest first and paged on (created_at, id)
+    '''
+    conditions = ["is_active = TRUE", "moderation_status = 'approved'"]
+    params: Dict[str, Any] = {'limit': page_size + 1}
+    if tags:
+        conditions.append("hashtags @> %(tags)s::text[]")
+        params['tags'] = tags
+
+    if text:
+        params['query'] = text
+        cursor_key = decode_search_cursor(cursor, 'rank')
+        cursor_filter = ''
+        if cursor_key:
+            cursor_filter = "WHERE (rank, id) < (%(cursor_rank)s, %(cursor_id)s)"
+            params['cursor_rank'], params['cursor_id'] = cursor_key
+        cur.execute(
+            f"""
+            SELECT * FROM (
+                SELECT {SEARCH_COLUMNS},
+                       ts_rank_cd(search_vector, websearch_to_tsquery('simple', %(query)s))::float8 AS rank
+                FROM tiktok_videos
+                WHERE search_vector @@ websearch_to_tsquery('simple', %(query)s)
+                  AND {' AND '.join(conditions)}
+            ) matches
+            {cursor_filter}
+            ORDER BY rank DESC, id DESC
+            LIMIT %(limit)s
+            """,
+            params
+        )
+        rows = cur.fetchall()
+        next_cursor = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            next_cursor = encode_search_cursor('rank', rows[-1]['rank'], rows[-1]['id'])
+        return rows, next_cursor
+
+    cursor_key = decode_search_cursor(cursor, 'time')
+    if cursor_key:
+        conditions.append("(created_at, id) < (%(cursor_ts)s, %(cursor_id)s)")
+        params['cursor_ts'], params['cursor_id'] = cursor_key
+    cur.execute(
+        f"""
+        SELECT {SEARCH_COLUMNS}
+        FROM tiktok_videos
+        WHERE {' AND '.join(conditions)}
+        ORDER BY created_at DESC, id DESC
+        LIMIT %(limit)s
+        """,
+        params
+    )
+    rows = cur.fetchall()
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_search_cursor('time', rows[-1]['created_at'], rows[-1]['id'])
+    return rows, next_cursor
+
+
+def encode_search_cursor(kind: str, key: Any, video_id: int) -> str:
+    '''Opaque cursor tagged with its ordering so it cannot be replayed against the other one'''
+    value = key.isoformat() if isinstance(key, datetime) else repr(float(key))
+    raw = f'{kind}|{value}|{video_id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_search_cursor(cursor: Optional[str], kind: str) -> Optional[Tuple[Any, int]]:
+    '''Inverse of encode_search_cursor; raises ValueError on malformed or mismatched input'''
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        cursor_kind, value, video_id = base64.urlsafe_b64decode(padded.encode()).decode().split('|', 2)
+        if cursor_kind != kind:
+            raise ValueError
+        key = datetime.fromisoformat(value) if kind == 'time' else float(value)
+        return key, int(video_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+
+def backfill_search_vectors(conn: Any, batch_size: int = 500, time_budget: float = 10.0) -> Dict[str, Any]:
+    '''
+    Fill search_vector for rows written before the trigger existed
+    Small committed batches with SKIP LOCKED keep row locks short and never block the table
+    '''
+    started = time.monotonic()
+    filled = 0
+    while time.monotonic() - started < time_budget:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                UPDATE tiktok_videos
+                SET search_vector = tiktok_video_search_vector(author, description)
+                WHERE id IN (
+                    SELECT id FROM tiktok_videos
+                    WHERE search_vector IS NULL
+                    ORDER BY id
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                )
+                """,
+                (batch_size,)
+            )
+            updated = cur.rowcount
+        conn.commit()
+        filled += updated
+        if updated < batch_size:
+            break
+    return {'filled': filled, 'elapsed_ms': round((time.monotonic() - started) * 1000, 1)}
@@ -0,0 +1,95 @@
+from typing import Callable, Dict, Any, Iterable, List, Optional, Set, Tuple
+from psycopg2.extras import execute_values
+from feed import FEED_FIELDS, render_feed_page, decode_cursor
+
+# Feed key of the unfiltered approved feed
+ALL_FEED = '*'
+
+
+def feed_key(category: Optional[str]) -> str:
+    return category or ALL_FEED
+
+
+def read_feed_snapshot(conn: Any, category: Optional[str], cursor: Optional[str],
+                       page_size: int) -> Optional[Tuple[str, str]]:
+    '''(body, etag) of a prebuilt page, or None when that page is not snapshotted'''
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT body, etag, page_size FROM feed_snapshots WHERE feed = %s AND page_cursor = %s",
+            (feed_key(category), cursor or '')
+        )
+        row = cur.fetchone()
+    if row is None or row[2] != page_size:
+        return None
+    return row[0], row[1]
+
+
+def visible_categories(cur: Any, video_ids: List[Any]) -> Set[str]:
+    '''Categories in which any of these videos currently appears in the approved feed'''
+    if not video_ids:
+        return set()
+    cur.execute(
+        """
+        SELECT DISTINCT COALESCE(category, 'general') FROM tiktok_videos
+        WHERE id = ANY(%s::int[]) AND is_active = TRUE AND moderation_status = 'approved'
+        """,
+        ([int(video_id) for video_id in video_ids],)
+    )
+    return {row[0] for row in cur.fetchall()}
+
+
+def rebuild_feed_snapshots(conn: Any, categories: Iterable[Optional[str]], page_size: int, pages: int,
+                           compute_etag: Callable[[str], str]) -> Dict[str, Any]:
+    '''
+    Re-render the first pages of the given category feeds inside the caller's transaction
+    A transaction-scoped advisory lock per feed serializes concurrent rebuilds of the same feed;
+    readers keep seeing the previous snapshot until the caller commits
+    '''
+    feeds = sorted({feed_key(category) for category in categories})
+    written = 0
+    for feed in feeds:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (f'feed_snapshots:{feed}',))
+
+        rows = []
+        cursor: Optional[str] = None
+        for page in range(pages):
+            body, next_cursor = render_feed_page(
+                conn, None if feed == ALL_FEED else feed, decode_cursor(cursor), page_size, FEED_FIELDS, 'rows'
+            )
+            rows.append((feed, cursor or '', page, page_size, body, compute_etag(body)))
+            if not next_cursor:
+                break
+            cursor = next_cursor
+
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM feed_snapshots WHERE feed = %s", (feed,))
+            execute_values(
+                cur,
+                """
+                INSERT INTO feed_snapshots (feed, page_cursor, page, page_size, body, etag)
+                VALUES %s
+                """,
+                rows,
+                page_size=len(rows)
+            )
+        written += len(rows)
+    return {'feeds': len(feeds), 'pages': written}
+
+
+def drop_feed_snapshots(cur: Any, categories: Iterable[Optional[str]]) -> None:
+    '''Forget the snapshots of these feeds so reads fall back to live queries until the next rebuild'''
+    cur.execute("DELETE FROM feed_snapshots WHERE feed = ANY(%s)", (sorted({feed_key(c) for c in categories}),))
+
+
+def rebuild_all_feed_snapshots(conn: Any, page_size: int, pages: int,
+                               compute_etag: Callable[[str], str]) -> Dict[str, Any]:
+    '''Every category in video_categories plus the unfiltered feed; commits when done'''
+    with conn.cursor() as cur:
+        cur.execute("SELECT name FROM video_categories")
+        categories: List[Optional[str]] = [row[0] for row in cur.fetchall()]
+        cur.execute("DELETE FROM feed_snapshots WHERE feed <> %s AND feed NOT IN (SELECT name FROM video_categories)",
+                    (ALL_FEED,))
+    result = rebuild_feed_snapshots(conn, categories + [None], page_size, pages, compute_etag)
+    conn.commit()
+    return result
@@ -0,0 +1,104 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Any, Optional
+from psycopg2.extras import execute_values
+from tracing import propagate
+
+
+def refresh_engagement_stats(conn: Any, fetch_stats: Callable[[str], Optional[Dict[str, Any]]],
+                             time_budget: float = 20.0, max_videos: int = 500,
+                             batch_size: int = 50, workers: int = 8) -> Dict[str, Any]:
+    '''
+    Re-sync likes/comments/shares/views for approved videos, stalest updated_at first
+    Each batch is fetched concurrently and written with one bulk UPDATE, then committed,
+    so a run cut short by the budget resumes from the next stalest rows on the next call
+    Rows whose fetch fails keep their counters but still get updated_at bumped,
+    otherwise a permanently broken video would pin the head of the queue
+    '''
+    started = time.monotonic()
+    with conn.cursor() as cur:
+        cur.execute("SELECT LOCALTIMESTAMP")
+        run_started_at = cur.fetchone()[0]
+    conn.commit()
+    result = {'processed': 0, 'updated': 0, 'failed': 0, 'batches': 0, 'stopped_reason': 'done'}
+    slowest_batch = 0.0
+
+    while True:
+        elapsed = time.monotonic() - started
+        if result['processed'] >= max_videos:
+            result['stopped_reason'] = 'max_videos'
+            break
+        if elapsed + slowest_batch > time_budget:
+            result['stopped_reason'] = 'time_budget'
+            break
+
+        batch_started = time.monotonic()
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT id, tiktok_url FROM tiktok_videos
+                WHERE is_active = TRUE AND moderation_status = 'approved' AND updated_at < %s
+                ORDER BY updated_at ASC, id ASC
+                LIMIT %s
+                """,
+                (run_started_at, min(batch_size, max_videos - result['processed']))
+            )
+            batch = cur.fetchall()
+        conn.commit()
+        if not batch:
+            break
+
+        urls = [url for _, url in batch]
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(urls)))) as executor:
+            fetched = list(executor.map(propagate(_safe_fetch(fetch_stats)), urls))
+
+        rows = []
+        for (video_id, _), video_data in zip(batch, fetched):
+            if video_data:
+                result['updated'] += 1
+                rows.append((
+                    video_id,
+                    video_data.get('likes'),
+                    video_data.get('comments'),
+                    video_data.get('shares'),
+                    video_data.get('views')
+                ))
+            else:
+                result['failed'] += 1
+                rows.append((video_id, None, None, None, None))
+
+        with conn.cursor() as cur:
+            execute_values(
+                cur,
+                """
+                UPDATE tiktok_videos AS t SET
+                    likes = COALESCE(v.likes, t.likes),
+                    comments = COALESCE(v.comments, t.comments),
+                    shares = COALESCE(v.shares, t.shares),
+                    views = COALESCE(v.views, t.views),
+                    updated_at = CURRENT_TIMESTAMP
+                FROM (VALUES %s) AS v(id, likes, comments, shares, views)
+                WHERE t.id = v.id
+                """,
+                rows,
+                template='(%s::int, %s::int, %s::int, %s::int, %s::int)',
+                page_size=len(rows)
+            )
+        conn.commit()
+
+        result['processed'] += len(batch)
+        result['batches'] += 1
+        slowest_batch = max(slowest_batch, time.monotonic() - batch_started)
+
+    result['elapsed_ms'] = round((time.monotonic() - started) * 1000, 1)
+    return result
+
+
+def _safe_fetch(fetch_stats: Callable[[str], Optional[Dict[str, Any]]]) -> Callable[[str], Optional[Dict[str, Any]]]:
+    def fetch(url: str) -> Optional[Dict[str, Any]]:
+        try:
+            return fetch_stats(url)
+        except Exception as e:
+            print(f'Stats refresh error for {url}: {e}')
+            return None
+    return fetch
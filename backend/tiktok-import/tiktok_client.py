@@ -0,0 +1,271 @@
+import json
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+import requests
+from db import get_pool
+from tracing import span
+
+
+class TokenBucket:
+    '''Thread-safe token bucket; acquire() blocks until a token is free or max_wait passes'''
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = max(rate, 0.001)
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, max_wait: float = 10.0) -> float:
+        '''Take one token; returns seconds spent waiting, raises TimeoutError past max_wait'''
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            if waited + delay > max_wait:
+                raise TimeoutError('TikTok API rate limit wait exceeded')
+            time.sleep(delay)
+            waited += delay
+
+
+class PostgresMetadataStore:
+    '''Second-level metadata cache in the tiktok_metadata_cache table, shared across containers'''
+
+    def __init__(self, pool: Any, ttl: float):
+        self.pool = pool
+        self.ttl = ttl
+
+    def get(self, video_id: str) -> Optional[Dict[str, Any]]:
+        conn = self.pool.getconn()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    SELECT metadata FROM tiktok_metadata_cache
+                    WHERE video_id = %s AND fetched_at > CURRENT_TIMESTAMP - make_interval(secs => %s)
+                    """,
+                    (video_id, self.ttl)
+                )
+                row = cur.fetchone()
+            conn.rollback()
+            return row[0] if row else None
+        finally:
+            self.pool.putconn(conn)
+
+    def set(self, video_id: str, metadata: Dict[str, Any]) -> None:
+        conn = self.pool.getconn()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    INSERT INTO tiktok_metadata_cache (video_id, metadata, fetched_at)
+                    VALUES (%s, %s, CURRENT_TIMESTAMP)
+                    ON CONFLICT (video_id)
+                    DO UPDATE SET metadata = EXCLUDED.metadata, fetched_at = EXCLUDED.fetched_at
+                    """,
+                    (video_id, json.dumps(metadata))
+                )
+            conn.commit()
+        finally:
+            self.pool.putconn(conn)
+
+
+class TikTokClient:
+    '''
+    Keep-alive client for the TikTok video query API
+    Adds a TTL cache of video_id -> video info, a token-bucket limiter and retry with backoff on 429/5xx
+    '''
+
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+    def __init__(self, client_key: str, base_url: str = 'https://open.tiktokapis.com',
+                 cache_ttl: float = 3600.0, cache_max_entries: int = 2048,
+                 rate: float = 5.0, burst: int = 10, max_retries: int = 3,
+                 backoff_base: float = 0.5, timeout: float = 10.0,
+                 store: Optional[PostgresMetadataStore] = None):
+        self.client_key = client_key
+        self.base_url = base_url.rstrip('/')
+        self.cache_ttl = cache_ttl
+        self.cache_max_entries = max(1, cache_max_entries)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.timeout = timeout
+        self.store = store
+        self.limiter = TokenBucket(rate, burst)
+        self.session = requests.Session()
+        self.session.headers.update({
+            'Authorization': f'Bearer {client_key}',
+            'Content-Type': 'application/json'
+        })
+        self._cache: 'OrderedDict[str, Any]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            'api_calls': 0,
+            'memory_hits': 0,
+            'store_hits': 0,
+            'retries': 0,
+            'rate_limited': 0,
+            'failures': 0,
+            'throttle_wait_ms': 0.0
+        }
+
+    def fetch_video(self, video_id: str, fresh: bool = False) -> Optional[Dict[str, Any]]:
+        '''
+        Video info dict from the API (or a cache), None when the API cannot provide it
+        fresh=True skips cache reads but still refreshes the cached entry
+        '''
+        cached = None if fresh else self._cache_get(video_id)
+        if cached is not None:
+            self._count('memory_hits')
+            return cached
+
+        if self.store is not None and not fresh:
+            try:
+                stored = self.store.get(video_id)
+            except Exception as e:
+                print(f'TikTok metadata store error: {e}')
+                stored = None
+            if stored is not None:
+                self._count('store_hits')
+                self._cache_set(video_id, stored)
+                return stored
+
+        video_info = self._request(video_id)
+        if video_info is None:
+            return None
+
+        self._cache_set(video_id, video_info)
+        if self.store is not None:
+            try:
+                self.store.set(video_id, video_info)
+            except Exception as e:
+                print(f'TikTok metadata store error: {e}')
+        return video_info
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            saved = self._stats['memory_hits'] + self._stats['store_hits']
+            return {
+                **self._stats,
+                'api_calls_saved': saved,
+                'cache_size': len(self._cache)
+            }
+
+    def _request(self, video_id: str) -> Optional[Dict[str, Any]]:
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self._count('retries')
+            try:
+                with span('http.tiktok.throttle'):
+                    waited = self.limiter.acquire()
+            except TimeoutError:
+                self._count('failures')
+                return None
+            if waited:
+                self._count('throttle_wait_ms', waited * 1000)
+
+            self._count('api_calls')
+            try:
+                with span('http.tiktok', attempt=attempt) as s:
+                    response = self.session.get(
+                        f'{self.base_url}/v2/video/query/',
+                        params={'video_id': video_id},
+                        timeout=self.timeout
+                    )
+                    s.tag(status=response.status_code)
+            except requests.RequestException as e:
+                print(f'TikTok API error: {e}')
+                if attempt < self.max_retries:
+                    time.sleep(self._backoff(attempt))
+                continue
+
+            if response.status_code == 200:
+                return response.json().get('data', {}).get('video', {})
+            if response.status_code not in self.RETRY_STATUSES:
+                break
+            if response.status_code == 429:
+                self._count('rate_limited')
+            if attempt < self.max_retries:
+                time.sleep(self._backoff(attempt, response.headers.get('Retry-After')))
+
+        self._count('failures')
+        return None
+
+    def _backoff(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        if retry_after:
+            try:
+                return min(float(retry_after), 5.0)
+            except ValueError:
+                pass
+        return self.backoff_base * (2 ** attempt) * (0.5 + random.random() / 2)
+
+    def _cache_get(self, video_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._cache.get(video_id)
+            if entry is None:
+                return None
+            expires_at, video_info = entry
+            if time.monotonic() >= expires_at:
+                del self._cache[video_id]
+                return None
+            self._cache.move_to_end(video_id)
+            return video_info
+
+    def _cache_set(self, video_id: str, video_info: Dict[str, Any]) -> None:
+        with self._lock:
+            self._cache[video_id] = (time.monotonic() + self.cache_ttl, video_info)
+            self._cache.move_to_end(video_id)
+            while len(self._cache) > self.cache_max_entries:
+                self._cache.popitem(last=False)
+
+    def _count(self, key: str, amount: float = 1) -> None:
+        with self._lock:
+            self._stats[key] += amount
+
+
+_clients: Dict[str, TikTokClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_tiktok_client(client_key: str) -> TikTokClient:
+    '''Module-level client per key so the session and caches survive warm invocations'''
+    client = _clients.get(client_key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(client_key)
+            if client is None:
+                cache_ttl = float(os.environ.get('TIKTOK_METADATA_TTL', '3600'))
+                store = None
+                if os.environ.get('TIKTOK_METADATA_DB_CACHE') == '1':
+                    store = PostgresMetadataStore(get_pool(), cache_ttl)
+                client = TikTokClient(
+                    client_key,
+                    base_url=os.environ.get('TIKTOK_API_BASE_URL', 'https://open.tiktokapis.com'),
+                    cache_ttl=cache_ttl,
+                    cache_max_entries=int(os.environ.get('TIKTOK_METADATA_MAX_ENTRIES', '2048')),
+                    rate=float(os.environ.get('TIKTOK_API_RATE', '5')),
+                    burst=int(os.environ.get('TIKTOK_API_BURST', '10')),
+                    max_retries=int(os.environ.get('TIKTOK_API_MAX_RETRIES', '3')),
+                    store=store
+                )
+                _clients[client_key] = client
+    return client
+
+
+def tiktok_client_stats() -> Dict[str, Any]:
+    '''Combined counters for every client created in this container'''
+    totals: Dict[str, Any] = {}
+    for client in list(_clients.values()):
+        for key, value in client.stats().items():
+            totals[key] = totals.get(key, 0) + value
+    return totals
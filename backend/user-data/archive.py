@@ -0,0 +1,64 @@
+import time
+from typing import Dict, Any
+
+INTERACTION_ARCHIVE_COLUMNS = "id, user_id, video_id, is_liked, is_saved, created_at, updated_at"
+
+
+def archive_unset_interactions(conn: Any, min_age_days: float = 7.0, batch_size: int = 1000,
+                               time_budget: float = 5.0) -> Dict[str, Any]:
+    '''
+    Move user_videos rows with neither like nor save, untouched for min_age_days, into user_videos_archive
+    Batches are claimed with SKIP LOCKED and committed one by one; a later like or save simply
+    inserts a fresh live row, and set_flag counts its delta from FALSE as before
+    '''
+    started = time.monotonic()
+    archived = 0
+    while time.monotonic() - started < time_budget:
+        with conn.cursor() as cur:
+            cur.execute(
+                f"""
+                WITH batch AS (
+                    SELECT id FROM user_videos
+                    WHERE is_liked = FALSE AND is_saved = FALSE
+                      AND updated_at < LOCALTIMESTAMP - make_interval(secs => %s)
+                    ORDER BY updated_at, id
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                ), moved AS (
+                    DELETE FROM user_videos uv
+                    USING batch b
+                    WHERE uv.id = b.id
+                    RETURNING uv.id, uv.user_id, uv.video_id, uv.is_liked, uv.is_saved, uv.created_at, uv.updated_at
+                )
+                INSERT INTO user_videos_archive ({INTERACTION_ARCHIVE_COLUMNS})
+                SELECT {INTERACTION_ARCHIVE_COLUMNS} FROM moved
+                """,
+                (min_age_days * 86400, batch_size)
+            )
+            moved = cur.rowcount
+        conn.commit()
+        archived += moved
+        if moved < batch_size:
+            break
+    return {'archived': archived, 'elapsed_ms': round((time.monotonic() - started) * 1000, 1)}
+
+
+def restore_interactions(cur: Any, user_id: str) -> int:
+    '''
+    Move a user's archived rows back into user_videos
+    Restored rows count as touched now, so the next archive pass leaves them alone for another
+    min_age_days; rows superseded by a newer live row for the same video are dropped from the archive instead
+    '''
+    cur.execute(
+        f"""
+        WITH moved AS (
+            DELETE FROM user_videos_archive WHERE user_id = %s
+            RETURNING {INTERACTION_ARCHIVE_COLUMNS}
+        )
+        INSERT INTO user_videos ({INTERACTION_ARCHIVE_COLUMNS})
+        SELECT id, user_id, video_id, is_liked, is_saved, created_at, CURRENT_TIMESTAMP FROM moved
+        ON CONFLICT (user_id, video_id) DO NOTHING
+        """,
+        (user_id,)
+    )
+    return cur.rowcount
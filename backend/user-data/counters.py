@@ -0,0 +1,164 @@
+import time
+from typing import Dict, Any, Optional, Tuple
+from psycopg2.extras import execute_values
+
+_last_flush_at = 0.0
+
+
+def set_flag(cur: Any, user_id: str, video_id: Any, column: str, value: bool) -> int:
+    '''
+    Upsert is_liked or is_saved for one (user, video) and return the counter delta (-1, 0 or 1)
+    The previous value is read under the row lock in the same statement, so repeated toggles do not double count
+    '''
+    cur.execute(
+        f"""
+        WITH prev AS (
+            SELECT {column} AS value FROM user_videos
+            WHERE user_id = %s AND video_id = %s
+            FOR UPDATE
+        ), upsert AS (
+            INSERT INTO user_videos (user_id, video_id, {column})
+            VALUES (%s, %s, %s)
+            ON CONFLICT (user_id, video_id)
+            DO UPDATE SET {column} = EXCLUDED.{column}, updated_at = CURRENT_TIMESTAMP
+            RETURNING {column} AS value
+        )
+        SELECT COALESCE((SELECT value FROM prev), FALSE), (SELECT value FROM upsert)
+        """,
+        (user_id, video_id, user_id, video_id, value)
+    )
+    before, after = cur.fetchone()
+    return int(bool(after)) - int(bool(before))
+
+
+def record_delta(cur: Any, video_id: Any, like_delta: int = 0, save_delta: int = 0) -> None:
+    '''Append a counter delta; folded into video_counters by flush_counter_deltas'''
+    if like_delta or save_delta:
+        cur.execute(
+            "INSERT INTO video_counter_deltas (video_id, like_delta, save_delta) VALUES (%s, %s, %s)",
+            (video_id, like_delta, save_delta)
+        )
+
+
+def flush_counter_deltas(conn: Any, max_rows: int = 5000) -> Dict[str, Any]:
+    '''
+    Fold up to max_rows pending deltas into video_counters with one aggregated upsert
+    SKIP LOCKED lets concurrent flushers split the backlog instead of blocking each other
+    '''
+    global _last_flush_at
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            WITH moved AS (
+                DELETE FROM video_counter_deltas
+                WHERE id IN (
+                    SELECT id FROM video_counter_deltas
+                    ORDER BY id
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING video_id, like_delta, save_delta
+            ), totals AS (
+                SELECT video_id, SUM(like_delta) AS likes, SUM(save_delta) AS saves, COUNT(*) AS deltas
+                FROM moved
+                GROUP BY video_id
+            ), applied AS (
+                INSERT INTO video_counters (video_id, app_likes, app_saves, updated_at)
+                SELECT video_id, likes, saves, CURRENT_TIMESTAMP FROM totals
+                ON CONFLICT (video_id)
+                DO UPDATE SET
+                    app_likes = GREATEST(video_counters.app_likes + EXCLUDED.app_likes, 0),
+                    app_saves = GREATEST(video_counters.app_saves + EXCLUDED.app_saves, 0),
+                    updated_at = CURRENT_TIMESTAMP
+                RETURNING video_id
+            )
+            SELECT (SELECT COALESCE(SUM(deltas), 0) FROM totals), (SELECT COUNT(*) FROM applied)
+            """,
+            (max_rows,)
+        )
+        deltas, videos = cur.fetchone()
+    conn.commit()
+    _last_flush_at = time.monotonic()
+    return {'deltas_flushed': int(deltas), 'videos_updated': int(videos)}
+
+
+def maybe_flush_counter_deltas(conn: Any, interval: float, max_rows: int) -> Optional[Dict[str, Any]]:
+    '''Flush at most once per interval per container, piggybacking on regular requests'''
+    if time.monotonic() - _last_flush_at < interval:
+        return None
+    try:
+        return flush_counter_deltas(conn, max_rows)
+    except Exception as e:
+        conn.rollback()
+        print(f'Counter flush error: {e}')
+        return None
+
+
+def set_flags_bulk(cur: Any, user_id: str, flags: Dict[int, Dict[str, bool]]) -> Dict[int, Dict[str, int]]:
+    '''
+    Apply final is_liked/is_saved values for many videos of one user with a single multi-row upsert
+    flags maps video_id to the columns being set; returns the per-video counter deltas
+    '''
+    deltas = set_flags_multi(cur, {(user_id, video_id): columns for video_id, columns in flags.items()})
+    return {video_id: delta for (_, video_id), delta in deltas.items()}
+
+
+def set_flags_multi(cur: Any, flags: Dict[Tuple[str, int], Dict[str, bool]]) -> Dict[Tuple[str, int], Dict[str, int]]:
+    '''
+    set_flags_bulk across many users: flags maps (user_id, video_id) to the columns being set
+    Existing rows are locked in key order so concurrent bulk writers cannot deadlock on each other
+    '''
+    if not flags:
+        return {}
+    keys = sorted(flags)
+    cur.execute(
+        """
+        SELECT uv.user_id, uv.video_id, uv.is_liked, uv.is_saved
+        FROM user_videos uv
+        JOIN unnest(%s::text[], %s::int[]) AS k(user_id, video_id)
+          ON uv.user_id = k.user_id AND uv.video_id = k.video_id
+        ORDER BY uv.user_id, uv.video_id
+        FOR UPDATE OF uv
+        """,
+        ([key[0] for key in keys], [key[1] for key in keys])
+    )
+    previous = {(row[0], row[1]): {'is_liked': bool(row[2]), 'is_saved': bool(row[3])} for row in cur.fetchall()}
+
+    rows = []
+    deltas: Dict[Tuple[str, int], Dict[str, int]] = {}
+    for key in keys:
+        before = previous.get(key, {'is_liked': False, 'is_saved': False})
+        after = {**before, **flags[key]}
+        rows.append((key[0], key[1], after['is_liked'], after['is_saved']))
+        deltas[key] = {
+            'like_delta': int(after['is_liked']) - int(before['is_liked']),
+            'save_delta': int(after['is_saved']) - int(before['is_saved'])
+        }
+
+    execute_values(
+        cur,
+        """
+        INSERT INTO user_videos (user_id, video_id, is_liked, is_saved)
+        VALUES %s
+        ON CONFLICT (user_id, video_id)
+        DO UPDATE SET is_liked = EXCLUDED.is_liked, is_saved = EXCLUDED.is_saved, updated_at = CURRENT_TIMESTAMP
+        """,
+        rows,
+        page_size=len(rows)
+    )
+    return deltas
+
+
+def record_deltas(cur: Any, deltas: Dict[int, Dict[str, int]]) -> None:
+    '''Multi-row form of record_delta'''
+    rows = [
+        (video_id, d['like_delta'], d['save_delta'])
+        for video_id, d in deltas.items() if d['like_delta'] or d['save_delta']
+    ]
+    if rows:
+        execute_values(
+            cur,
+            "INSERT INTO video_counter_deltas (video_id, like_delta, save_delta) VALUES %s",
+            rows,
+            page_size=len(rows)
+        )
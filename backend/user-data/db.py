@@ -0,0 +1,199 @@
+import os
+import threading
+import time
+from typing import Dict, Any, List, Optional
+import psycopg2
+import psycopg2.extensions
+from tracing import CONNECTION_FACTORY, span
+
+
+class ConnectionPool:
+    '''
+    Process-wide Postgres connection pool that survives warm invocations
+    Connections are health-checked on checkout and recycled after max_lifetime
+    '''
+
+    def __init__(self, dsn: str, max_size: int = 4, max_lifetime: float = 600.0,
+                 max_idle: float = 300.0, healthcheck_interval: float = 30.0,
+                 wait_timeout: float = 5.0):
+        self.dsn = dsn
+        self.max_size = max(1, max_size)
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+        self.healthcheck_interval = healthcheck_interval
+        self.wait_timeout = wait_timeout
+        self._idle: List[Dict[str, Any]] = []
+        self._in_use: Dict[int, Dict[str, Any]] = {}
+        self._lock = threading.Condition()
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'recycled': 0,
+            'discarded': 0,
+            'waits': 0,
+            'wait_time_ms': 0.0,
+            'connect_time_ms': 0.0
+        }
+
+    def getconn(self) -> Any:
+        '''Check out a healthy connection, opening a new one only when the pool is empty'''
+        with span('db.getconn'):
+            return self._checkout()
+
+    def _checkout(self) -> Any:
+        started = time.monotonic()
+        waited = False
+        while True:
+            with self._lock:
+                while not self._idle and len(self._in_use) >= self.max_size:
+                    waited = True
+                    remaining = self.wait_timeout - (time.monotonic() - started)
+                    if remaining <= 0:
+                        raise psycopg2.OperationalError('Connection pool exhausted')
+                    self._lock.wait(remaining)
+                if waited:
+                    self._stats['waits'] += 1
+                    self._stats['wait_time_ms'] += (time.monotonic() - started) * 1000
+                    waited = False
+
+                if self._idle:
+                    # Reserve the connection so the health check can run without holding the lock
+                    entry = self._idle.pop()
+                    self._in_use[id(entry['conn'])] = entry
+                else:
+                    entry = None
+                    self._stats['misses'] += 1
+                    # Reserve the slot before releasing the lock to connect
+                    placeholder: Dict[str, Any] = {'conn': None}
+                    self._in_use[id(placeholder)] = placeholder
+
+            if entry is None:
+                break
+            if self._is_usable(entry):
+                with self._lock:
+                    self._stats['hits'] += 1
+                entry['checked_out_at'] = time.monotonic()
+                return entry['conn']
+            with self._lock:
+                self._stats['recycled'] += 1
+                self._in_use.pop(id(entry['conn']), None)
+                self._lock.notify()
+            self._close(entry['conn'])
+
+        connect_started = time.monotonic()
+        try:
+            with span('db.connect'):
+                conn = psycopg2.connect(self.dsn, connection_factory=CONNECTION_FACTORY)
+        except Exception:
+            with self._lock:
+                self._in_use.pop(id(placeholder), None)
+                self._lock.notify()
+            raise
+        now = time.monotonic()
+
+        with self._lock:
+            self._stats['connect_time_ms'] += (now - connect_started) * 1000
+            self._in_use.pop(id(placeholder), None)
+            self._in_use[id(conn)] = {
+                'conn': conn,
+                'created_at': now,
+                'last_used_at': now,
+                'last_checked_at': now,
+                'checked_out_at': now
+            }
+        return conn
+
+    def putconn(self, conn: Any) -> None:
+        '''Return a connection, rolling back any open transaction and discarding broken ones'''
+        # The entry stays reserved in _in_use during the rollback, so a waiting checkout cannot
+        # open a replacement connection and push the pool past max_size
+        with self._lock:
+            entry = self._in_use.get(id(conn))
+
+        if entry is None:
+            self._close(conn)
+            return
+
+        if not conn.closed:
+            try:
+                if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except Exception:
+                self._close(conn)
+
+        now = time.monotonic()
+        with self._lock:
+            self._in_use.pop(id(conn), None)
+            if conn.closed or now - entry['created_at'] > self.max_lifetime:
+                self._stats['discarded'] += 1
+                self._close(conn)
+            else:
+                entry['last_used_at'] = now
+                self._idle.append(entry)
+            self._lock.notify()
+
+    def stats(self) -> Dict[str, Any]:
+        '''Snapshot of pool counters for diagnostics'''
+        with self._lock:
+            checkouts = self._stats['hits'] + self._stats['misses']
+            return {
+                **self._stats,
+                'hit_ratio': round(self._stats['hits'] / checkouts, 4) if checkouts else 0.0,
+                'idle': len(self._idle),
+                'in_use': len(self._in_use),
+                'max_size': self.max_size
+            }
+
+    def closeall(self) -> None:
+        with self._lock:
+            for entry in self._idle:
+                self._close(entry['conn'])
+            self._idle = []
+
+    def _is_usable(self, entry: Dict[str, Any]) -> bool:
+        conn = entry['conn']
+        now = time.monotonic()
+        if conn.closed:
+            return False
+        if now - entry['created_at'] > self.max_lifetime:
+            return False
+        if now - entry['last_used_at'] > self.max_idle:
+            return False
+        if now - entry['last_checked_at'] < self.healthcheck_interval:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute('SELECT 1')
+            conn.rollback()
+        except Exception:
+            return False
+        entry['last_checked_at'] = now
+        return True
+
+    @staticmethod
+    def _close(conn: Any) -> None:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    '''Module-level pool shared by every invocation handled by this container'''
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    os.environ.get('DATABASE_URL'),
+                    max_size=int(os.environ.get('DB_POOL_MAX_SIZE', '4')),
+                    max_lifetime=float(os.environ.get('DB_POOL_MAX_LIFETIME', '600')),
+                    max_idle=float(os.environ.get('DB_POOL_MAX_IDLE', '300')),
+                    healthcheck_interval=float(os.environ.get('DB_POOL_HEALTHCHECK_INTERVAL', '30')),
+                    wait_timeout=float(os.environ.get('DB_POOL_WAIT_TIMEOUT', '5'))
+                )
+    return _pool
@@ -1,9 +1,70 @@
+import base64
+import hashlib
 import json
 import os
-from typing import Dict, Any
-import psycopg2
-from psycopg2.extras import RealDictCursor
+from datetime import datetime
+from typing import Dict, Any, Optional, Tuple
+from db import get_pool
+from counters import set_flag, set_flags_bulk, record_delta, record_deltas, flush_counter_deltas, maybe_flush_counter_deltas
+from tracing import traced, span
+from archive import archive_unset_interactions, restore_interactions
+from interaction_queue import (
+    enqueue_interactions, drain_interaction_queue, maybe_flush_interaction_queue, prune_idempotency_keys, queue_lag
+)
 
+COUNTER_FLUSH_INTERVAL = float(os.environ.get('COUNTER_FLUSH_INTERVAL', '5'))
+COUNTER_FLUSH_MAX_ROWS = int(os.environ.get('COUNTER_FLUSH_MAX_ROWS', '5000'))
+MAX_BATCH_ACTIONS = int(os.environ.get('MAX_BATCH_ACTIONS', '200'))
+DEFAULT_PAGE_SIZE = int(os.environ.get('USER_LIST_PAGE_SIZE', '30'))
+MAX_PAGE_SIZE = 100
+ARCHIVE_INTERACTION_AFTER_DAYS = float(os.environ.get('ARCHIVE_INTERACTION_AFTER_DAYS', '7'))
+ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', '1000'))
+# Write-behind mode: likes and saves are queued and acknowledged with 202, then applied in bulk by the flusher
+WRITE_BEHIND = os.environ.get('INTERACTION_WRITE_BEHIND') == '1'
+INTERACTION_FLUSH_INTERVAL = float(os.environ.get('INTERACTION_FLUSH_INTERVAL', '2'))
+INTERACTION_FLUSH_MAX_ROWS = int(os.environ.get('INTERACTION_FLUSH_MAX_ROWS', '5000'))
+IDEMPOTENCY_KEY_TTL_HOURS = float(os.environ.get('IDEMPOTENCY_KEY_TTL_HOURS', '24'))
+MAX_IDEMPOTENCY_KEY_LENGTH = 128
+
+USER_VIDEO_LIST_SQL = """
+    SELECT COALESCE(json_agg(l ORDER BY l.interacted_at DESC, l.video_id DESC), '[]'::json)
+    FROM (
+        SELECT uv.video_id, uv.updated_at AS interacted_at,
+               CASE WHEN t.id IS NULL THEN NULL ELSE json_build_object(
+                   'id', t.id,
+                   'tiktok_url', t.tiktok_url,
+                   'video_url', t.video_url,
+                   'author', t.author,
+                   'author_avatar', t.author_avatar,
+                   'description', t.description,
+                   'likes', t.likes,
+                   'comments', t.comments,
+                   'shares', t.shares,
+                   'views', t.views,
+                   'hashtags', t.hashtags,
+                   'category', t.category,
+                   'created_at', t.created_at
+               ) END AS video
+        FROM user_videos uv
+        LEFT JOIN tiktok_videos t ON t.id = uv.video_id AND t.is_active = TRUE
+        WHERE uv.user_id = %(user_id)s AND uv.{flag} = TRUE
+          AND (%({prefix}_ts)s::timestamp IS NULL
+               OR (uv.updated_at, uv.video_id) < (%({prefix}_ts)s::timestamp, %({prefix}_id)s::int))
+        ORDER BY uv.updated_at DESC, uv.video_id DESC
+        LIMIT %(limit)s
+    ) l
+"""
+
+USER_STATE_SQL = f"""
+    SELECT
+        (SELECT row_to_json(s) FROM user_settings s WHERE s.user_id = %(user_id)s) AS settings,
+        (SELECT json_build_object('profile_name', u.profile_name, 'avatar_url', u.avatar_url)
+         FROM users u WHERE u.user_id = %(user_id)s) AS profile,
+        ({USER_VIDEO_LIST_SQL.format(flag='is_liked', prefix='liked')}) AS liked,
+        ({USER_VIDEO_LIST_SQL.format(flag='is_saved', prefix='saved')}) AS saved
+"""
+
+@traced('user-data')
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Business: Manage user data (saved videos, likes, settings)
@@ -13,13 +74,37 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     method: str = event.get('httpMethod', 'GET')
     
+    if is_timer_trigger(event):
+        pool = get_pool()
+        conn = pool.getconn()
+        try:
+            # Queue first: its flush produces counter deltas for the flush below
+            interactions = drain_interaction_queue(conn, INTERACTION_FLUSH_MAX_ROWS)
+            flushed = flush_counter_deltas(conn, COUNTER_FLUSH_MAX_ROWS)
+            archived = archive_unset_interactions(conn, ARCHIVE_INTERACTION_AFTER_DAYS, ARCHIVE_BATCH_SIZE)
+            pruned_keys = prune_idempotency_keys(conn, IDEMPOTENCY_KEY_TTL_HOURS)
+        finally:
+            pool.putconn(conn)
+        return {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/json'},
+            'isBase64Encoded': False,
+            'body': json.dumps({
+                'success': True,
+                **flushed,
+                'interactions': interactions,
+                'archive': archived,
+                'idempotency_keys_pruned': pruned_keys
+            })
+        }
+    
     if method == 'OPTIONS':
         return {
             'statusCode': 200,
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, PUT, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, If-None-Match, Idempotency-Key',
                 'Access-Control-Max-Age': '86400'
             },
             'body': ''
@@ -28,36 +113,27 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     headers = event.get('headers', {})
     user_id = headers.get('X-User-Id') or headers.get('x-user-id', 'anonymous')
     
-    dsn = os.environ.get('DATABASE_URL')
-    conn = psycopg2.connect(dsn)
+    pool = get_pool()
+    conn = pool.getconn()
     
     try:
         if method == 'GET':
-            with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute(
-                    "SELECT * FROM user_videos WHERE user_id = %s",
-                    (user_id,)
-                )
-                videos = cur.fetchall()
-                
-                cur.execute(
-                    "SELECT * FROM user_settings WHERE user_id = %s",
-                    (user_id,)
-                )
-                settings = cur.fetchone()
-                
-                cur.execute(
-                    "SELECT profile_name, avatar_url FROM users WHERE user_id = %s",
-                    (user_id,)
-                )
-                profile = cur.fetchone()
-                
-                result = {
-                    'videos': [dict(v) for v in videos] if videos else [],
-                    'settings': dict(settings) if settings else None,
-                    'profile': dict(profile) if profile else None
+            query_params = event.get('queryStringParameters') or {}
+            if query_params.get('action') == 'pool_stats':
+                return {
+                    'statusCode': 200,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'isBase64Encoded': False,
+                    'body': json.dumps({'pool': pool.stats()})
                 }
-                
+            
+            if query_params.get('action') == 'queue_stats':
+                with conn.cursor() as cur:
+                    lag = queue_lag(cur)
+                conn.rollback()
                 return {
                     'statusCode': 200,
                     'headers': {
@@ -65,88 +141,183 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         'Access-Control-Allow-Origin': '*'
                     },
                     'isBase64Encoded': False,
-                    'body': json.dumps(result, default=str)
+                    'body': json.dumps({'write_behind': WRITE_BEHIND, **lag})
+                }
+            
+            try:
+                page_size = parse_page_size(query_params.get('limit'))
+                liked_cursor = decode_cursor(query_params.get('liked_cursor'))
+                saved_cursor = decode_cursor(query_params.get('saved_cursor'))
+            except ValueError as e:
+                return {
+                    'statusCode': 400,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'isBase64Encoded': False,
+                    'body': json.dumps({'error': str(e)})
                 }
+            
+            with conn.cursor() as cur:
+                result = load_user_state(cur, user_id, page_size, liked_cursor, saved_cursor)
+                
+                with span('serialize'):
+                    body = json.dumps(result, default=str)
+                return conditional_response(body, compute_etag(body), headers, {'Vary': 'X-User-Id'})
         
         elif method == 'POST':
             body_data = json.loads(event.get('body', '{}'))
             action = body_data.get('action')
             
+            if action == 'restore_interactions':
+                with conn.cursor() as cur:
+                    restored = restore_interactions(cur, user_id)
+                conn.commit()
+                
+                return {
+                    'statusCode': 200,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'isBase64Encoded': False,
+                    'body': json.dumps({'success': True, 'restored': restored})
+                }
+            
+            actions = body_data.get('actions')
+            if actions is not None:
+                try:
+                    plan = coalesce_actions(actions)
+                except ValueError as e:
+                    return {
+                        'statusCode': 400,
+                        'headers': {
+                            'Content-Type': 'application/json',
+                            'Access-Control-Allow-Origin': '*'
+                        },
+                        'isBase64Encoded': False,
+                        'body': json.dumps({'error': str(e)})
+                    }
+                
+                if WRITE_BEHIND and plan['flags']:
+                    try:
+                        idempotency_key = parse_idempotency_key(headers, body_data)
+                    except ValueError as e:
+                        return {
+                            'statusCode': 400,
+                            'headers': {
+                                'Content-Type': 'application/json',
+                                'Access-Control-Allow-Origin': '*'
+                            },
+                            'isBase64Encoded': False,
+                            'body': json.dumps({'error': str(e)})
+                        }
+                    with conn.cursor() as cur:
+                        queued = enqueue_interactions(cur, user_id, plan['flags'], idempotency_key)
+                        applied = apply_actions(cur, user_id, {**plan, 'flags': {}})
+                    conn.commit()
+                    maybe_flush_interaction_queue(conn, INTERACTION_FLUSH_INTERVAL, INTERACTION_FLUSH_MAX_ROWS)
+                    maybe_flush_counter_deltas(conn, COUNTER_FLUSH_INTERVAL, COUNTER_FLUSH_MAX_ROWS)
+                    
+                    return {
+                        'statusCode': 202,
+                        'headers': {
+                            'Content-Type': 'application/json',
+                            'Access-Control-Allow-Origin': '*'
+                        },
+                        'isBase64Encoded': False,
+                        'body': json.dumps({
+                            'success': True,
+                            'message': 'Accepted',
+                            'received': len(actions),
+                            'queued': queued or 0,
+                            'duplicate': queued is None,
+                            'applied': applied
+                        })
+                    }
+                
+                with conn.cursor() as cur:
+                    applied = apply_actions(cur, user_id, plan)
+                conn.commit()
+                maybe_flush_counter_deltas(conn, COUNTER_FLUSH_INTERVAL, COUNTER_FLUSH_MAX_ROWS)
+                
+                return {
+                    'statusCode': 200,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'isBase64Encoded': False,
+                    'body': json.dumps({
+                        'success': True,
+                        'message': 'Data saved',
+                        'received': len(actions),
+                        'applied': applied
+                    })
+                }
+            
+            if WRITE_BEHIND and action in ('like_video', 'save_video'):
+                column = 'is_liked' if action == 'like_video' else 'is_saved'
+                try:
+                    video_id = parse_video_id(body_data.get('video_id'))
+                    idempotency_key = parse_idempotency_key(headers, body_data)
+                except ValueError as e:
+                    return {
+                        'statusCode': 400,
+                        'headers': {
+                            'Content-Type': 'application/json',
+                            'Access-Control-Allow-Origin': '*'
+                        },
+                        'isBase64Encoded': False,
+                        'body': json.dumps({'error': str(e)})
+                    }
+                with conn.cursor() as cur:
+                    queued = enqueue_interactions(
+                        cur, user_id, {video_id: {column: bool(body_data.get(column, False))}}, idempotency_key
+                    )
+                conn.commit()
+                maybe_flush_interaction_queue(conn, INTERACTION_FLUSH_INTERVAL, INTERACTION_FLUSH_MAX_ROWS)
+                maybe_flush_counter_deltas(conn, COUNTER_FLUSH_INTERVAL, COUNTER_FLUSH_MAX_ROWS)
+                
+                return {
+                    'statusCode': 202,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'isBase64Encoded': False,
+                    'body': json.dumps({'success': True, 'message': 'Accepted', 'duplicate': queued is None})
+                }
+            
             with conn.cursor() as cur:
                 if action == 'save_video':
                     video_id = body_data.get('video_id')
                     is_saved = body_data.get('is_saved', False)
                     
-                    cur.execute(
-                        """
-                        INSERT INTO user_videos (user_id, video_id, is_saved)
-                        VALUES (%s, %s, %s)
-                        ON CONFLICT (user_id, video_id)
-                        DO UPDATE SET is_saved = %s, updated_at = CURRENT_TIMESTAMP
-                        """,
-                        (user_id, video_id, is_saved, is_saved)
-                    )
-                    
+                    save_delta = set_flag(cur, user_id, video_id, 'is_saved', is_saved)
+                    record_delta(cur, video_id, save_delta=save_delta)
+                
                 elif action == 'like_video':
                     video_id = body_data.get('video_id')
                     is_liked = body_data.get('is_liked', False)
                     
-                    cur.execute(
-                        """
-                        INSERT INTO user_videos (user_id, video_id, is_liked)
-                        VALUES (%s, %s, %s)
-                        ON CONFLICT (user_id, video_id)
-                        DO UPDATE SET is_liked = %s, updated_at = CURRENT_TIMESTAMP
-                        """,
-                        (user_id, video_id, is_liked, is_liked)
-                    )
+                    like_delta = set_flag(cur, user_id, video_id, 'is_liked', is_liked)
+                    record_delta(cur, video_id, like_delta=like_delta)
                 
                 elif action == 'update_settings':
                     settings = body_data.get('settings', {})
                     
-                    cur.execute(
-                        """
-                        INSERT INTO user_settings (user_id, dark_mode, language, notifications_enabled, auto_sound)
-                        VALUES (%s, %s, %s, %s, %s)
-                        ON CONFLICT (user_id)
-                        DO UPDATE SET 
-                            dark_mode = %s,
-                            language = %s,
-                            notifications_enabled = %s,
-                            auto_sound = %s,
-                            updated_at = CURRENT_TIMESTAMP
-                        """,
-                        (
-                            user_id,
-                            settings.get('dark_mode', False),
-                            settings.get('language', 'ru'),
-                            settings.get('notifications_enabled', True),
-                            settings.get('auto_sound', False),
-                            settings.get('dark_mode', False),
-                            settings.get('language', 'ru'),
-                            settings.get('notifications_enabled', True),
-                            settings.get('auto_sound', False)
-                        )
-                    )
+                    upsert_settings(cur, user_id, settings)
                 
                 elif action == 'update_profile':
                     profile_name = body_data.get('profile_name', '@my_profile')
                     avatar_url = body_data.get('avatar_url')
                     
-                    cur.execute(
-                        """
-                        INSERT INTO users (user_id, profile_name, avatar_url)
-                        VALUES (%s, %s, %s)
-                        ON CONFLICT (user_id)
-                        DO UPDATE SET 
-                            profile_name = %s,
-                            avatar_url = %s,
-                            updated_at = CURRENT_TIMESTAMP
-                        """,
-                        (user_id, profile_name, avatar_url, profile_name, avatar_url)
-                    )
+                    upsert_profile(cur, user_id, profile_name, avatar_url)
                 
                 conn.commit()
+                maybe_flush_counter_deltas(conn, COUNTER_FLUSH_INTERVAL, COUNTER_FLUSH_MAX_ROWS)
                 
                 return {
                     'statusCode': 200,
@@ -165,4 +336,228 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         }
     
     finally:
-        conn.close()
\ No newline at end of file
+        pool.putconn(conn)
+
+
+def compute_etag(body: str) -> str:
+    '''Strong validator derived from the serialized body'''
+    return '"' + hashlib.sha1(body.encode('utf-8')).hexdigest()[:20] + '"'
+
+
+def etag_matches(request_headers: Dict[str, Any], etag: str) -> bool:
+    '''Check If-None-Match (any casing, comma lists, weak tags, *) against etag'''
+    header = request_headers.get('If-None-Match') or request_headers.get('if-none-match')
+    if not header:
+        return False
+    for candidate in header.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == '*' or candidate == etag:
+            return True
+    return False
+
+
+def conditional_response(body: str, etag: str, request_headers: Dict[str, Any],
+                         extra_headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    '''200 with body and ETag, or an empty 304 when the client already has this version'''
+    response_headers = {
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Expose-Headers': 'ETag',
+        'Cache-Control': 'no-cache',
+        'ETag': etag,
+        **(extra_headers or {})
+    }
+    if etag_matches(request_headers, etag):
+        return {
+            'statusCode': 304,
+            'headers': response_headers,
+            'isBase64Encoded': False,
+            'body': ''
+        }
+    return {
+        'statusCode': 200,
+        'headers': {'Content-Type': 'application/json', **response_headers},
+        'isBase64Encoded': False,
+        'body': body
+    }
+
+
+def is_timer_trigger(event: Dict[str, Any]) -> bool:
+    '''Scheduled invocations arrive as trigger messages instead of HTTP events'''
+    messages = event.get('messages')
+    if 'httpMethod' in event or not isinstance(messages, list) or not messages:
+        return False
+    event_type = (messages[0].get('event_metadata') or {}).get('event_type', '')
+    return event_type.endswith('TimerMessage')
+
+
+def load_user_state(cur: Any, user_id: str, page_size: int,
+                    liked_cursor: Optional[Tuple[datetime, int]],
+                    saved_cursor: Optional[Tuple[datetime, int]]) -> Dict[str, Any]:
+    '''
+    Settings, profile and one page each of liked and saved videos in a single round trip
+    List items are hydrated with tiktok_videos metadata; video is null for ids that are not in the catalog
+    '''
+    cur.execute(
+        USER_STATE_SQL,
+        {
+            'user_id': user_id,
+            'limit': page_size + 1,
+            'liked_ts': liked_cursor[0] if liked_cursor else None,
+            'liked_id': liked_cursor[1] if liked_cursor else None,
+            'saved_ts': saved_cursor[0] if saved_cursor else None,
+            'saved_id': saved_cursor[1] if saved_cursor else None
+        }
+    )
+    settings, profile, liked, saved = cur.fetchone()
+    
+    result: Dict[str, Any] = {'settings': settings, 'profile': profile}
+    for name, items in (('liked', liked), ('saved', saved)):
+        next_cursor = None
+        if len(items) > page_size:
+            items = items[:page_size]
+            last = items[-1]
+            next_cursor = encode_cursor(datetime.fromisoformat(last['interacted_at']), last['video_id'])
+        result[name] = {'items': items, 'next_cursor': next_cursor}
+    return result
+
+
+def coalesce_actions(actions: Any) -> Dict[str, Any]:
+    '''
+    Validate a batch of actions and collapse it to final state, last write wins
+    Repeated toggles of the same video and repeated settings/profile updates keep only the latest value
+    '''
+    if not isinstance(actions, list) or not actions:
+        raise ValueError('actions must be a non-empty list')
+    if len(actions) > MAX_BATCH_ACTIONS:
+        raise ValueError(f'At most {MAX_BATCH_ACTIONS} actions per batch')
+    
+    plan: Dict[str, Any] = {'flags': {}, 'settings': None, 'profile': None}
+    for item in actions:
+        if not isinstance(item, dict):
+            raise ValueError('Each action must be an object')
+        action = item.get('action')
+        if action in ('like_video', 'save_video'):
+            try:
+                video_id = int(item.get('video_id'))
+            except (TypeError, ValueError):
+                raise ValueError(f'{action} requires an integer video_id')
+            column = 'is_liked' if action == 'like_video' else 'is_saved'
+            plan['flags'].setdefault(video_id, {})[column] = bool(item.get(column, False))
+        elif action == 'update_settings':
+            plan['settings'] = item.get('settings', {})
+        elif action == 'update_profile':
+            plan['profile'] = (item.get('profile_name', '@my_profile'), item.get('avatar_url'))
+        else:
+            raise ValueError(f'Unknown action: {action}')
+    return plan
+
+
+def apply_actions(cur: Any, user_id: str, plan: Dict[str, Any]) -> Dict[str, int]:
+    '''Write a coalesced plan in the current transaction with one multi-row upsert for video flags'''
+    deltas = set_flags_bulk(cur, user_id, plan['flags'])
+    record_deltas(cur, deltas)
+    if plan['settings'] is not None:
+        upsert_settings(cur, user_id, plan['settings'])
+    if plan['profile'] is not None:
+        upsert_profile(cur, user_id, *plan['profile'])
+    return {
+        'videos': len(plan['flags']),
+        'settings': int(plan['settings'] is not None),
+        'profile': int(plan['profile'] is not None)
+    }
+
+
+def parse_video_id(raw: Any) -> int:
+    try:
+        return int(raw)
+    except (TypeError, ValueError):
+        raise ValueError('video_id must be an integer')
+
+
+def parse_idempotency_key(request_headers: Dict[str, Any], body_data: Dict[str, Any]) -> Optional[str]:
+    '''Idempotency-Key header (any casing) or idempotency_key in the body; None when absent'''
+    key = (request_headers.get('Idempotency-Key') or request_headers.get('idempotency-key')
+           or body_data.get('idempotency_key'))
+    if key is None or key == '':
+        return None
+    key = str(key)
+    if len(key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+        raise ValueError(f'Idempotency key longer than {MAX_IDEMPOTENCY_KEY_LENGTH} characters')
+    return key
+
+
+def upsert_settings(cur: Any, user_id: str, settings: Dict[str, Any]) -> None:
+    '''Insert or replace the user's settings row'''
+    cur.execute(
+        """
+        INSERT INTO user_settings (user_id, dark_mode, language, notifications_enabled, auto_sound)
+        VALUES (%s, %s, %s, %s, %s)
+        ON CONFLICT (user_id)
+        DO UPDATE SET 
+            dark_mode = %s,
+            language = %s,
+            notifications_enabled = %s,
+            auto_sound = %s,
+            updated_at = CURRENT_TIMESTAMP
+        """,
+        (
+            user_id,
+            settings.get('dark_mode', False),
+            settings.get('language', 'ru'),
+            settings.get('notifications_enabled', True),
+            settings.get('auto_sound', False),
+            settings.get('dark_mode', False),
+            settings.get('language', 'ru'),
+            settings.get('notifications_enabled', True),
+            settings.get('auto_sound', False)
+        )
+    )
+
+
+def upsert_profile(cur: Any, user_id: str, profile_name: str, avatar_url: Optional[str]) -> None:
+    '''Insert or replace the user's profile fields'''
+    cur.execute(
+        """
+        INSERT INTO users (user_id, profile_name, avatar_url)
+        VALUES (%s, %s, %s)
+        ON CONFLICT (user_id)
+        DO UPDATE SET 
+            profile_name = %s,
+            avatar_url = %s,
+            updated_at = CURRENT_TIMESTAMP
+        """,
+        (user_id, profile_name, avatar_url, profile_name, avatar_url)
+    )
+
+
+def parse_page_size(raw: Optional[str]) -> int:
+    '''Validate the limit query parameter against the configured bounds'''
+    if raw is None or raw == '':
+        return DEFAULT_PAGE_SIZE
+    try:
+        size = int(raw)
+    except (TypeError, ValueError):
+        raise ValueError('limit must be an integer')
+    if size < 1:
+        raise ValueError('limit must be positive')
+    return min(size, MAX_PAGE_SIZE)
+
+
+def encode_cursor(interacted_at: datetime, video_id: int) -> str:
+    '''Opaque keyset cursor pointing just past (interacted_at, video_id)'''
+    raw = f'{interacted_at.isoformat()}|{video_id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime, int]]:
+    '''Inverse of encode_cursor; raises ValueError on malformed input'''
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        interacted_at, video_id = base64.urlsafe_b64decode(padded.encode()).decode().split('|', 1)
+        return datetime.fromisoformat(interacted_at), int(video_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
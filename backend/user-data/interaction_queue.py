@@ -0,0 +1,169 @@
+import time
+from typing import Dict, Any, Optional, Tuple
+from counters import set_flags_multi, record_deltas
+
+_last_flush_at = 0.0
+
+# Flushes are serialized: two flushers holding different events for the same pair could
+# otherwise commit in the wrong order and let an older value overwrite a newer one
+FLUSH_LOCK_KEY = 'user_interaction_queue:flush'
+
+
+def enqueue_interactions(cur: Any, user_id: str, flags: Dict[int, Dict[str, bool]],
+                         idempotency_key: Optional[str] = None) -> Optional[int]:
+    '''
+    Append like/save events for one user to the write-behind queue in a single statement
+    With an idempotency key the events are queued only if the key is new for this user;
+    returns the number of queued events, or None when the key was already used
+    '''
+    video_ids = list(flags.keys())
+    liked = [flags[video_id].get('is_liked') for video_id in video_ids]
+    saved = [flags[video_id].get('is_saved') for video_id in video_ids]
+    if idempotency_key is None:
+        cur.execute(
+            """
+            INSERT INTO user_interaction_queue (user_id, video_id, is_liked, is_saved)
+            SELECT %s, v.video_id, v.is_liked, v.is_saved
+            FROM unnest(%s::int[], %s::boolean[], %s::boolean[]) AS v(video_id, is_liked, is_saved)
+            """,
+            (user_id, video_ids, liked, saved)
+        )
+        return cur.rowcount
+
+    cur.execute(
+        """
+        WITH accepted AS (
+            INSERT INTO user_interaction_keys (user_id, idempotency_key)
+            VALUES (%s, %s)
+            ON CONFLICT (user_id, idempotency_key) DO NOTHING
+            RETURNING user_id
+        ), queued AS (
+            INSERT INTO user_interaction_queue (user_id, video_id, is_liked, is_saved)
+            SELECT a.user_id, v.video_id, v.is_liked, v.is_saved
+            FROM accepted a
+            CROSS JOIN unnest(%s::int[], %s::boolean[], %s::boolean[]) AS v(video_id, is_liked, is_saved)
+            RETURNING 1
+        )
+        SELECT (SELECT COUNT(*) FROM accepted), (SELECT COUNT(*) FROM queued)
+        """,
+        (user_id, idempotency_key, video_ids, liked, saved)
+    )
+    accepted, queued = cur.fetchone()
+    return int(queued) if accepted else None
+
+
+def flush_interaction_queue(conn: Any, max_rows: int = 5000) -> Dict[str, Any]:
+    '''
+    Apply up to max_rows queued events: the latest value per (user_id, video_id, flag) wins,
+    and all pairs are written with one locked read, one multi-row upsert and one delta insert
+    Returns at once with nothing flushed when another flush holds the lock
+    '''
+    global _last_flush_at
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_try_advisory_xact_lock(hashtext(%s))", (FLUSH_LOCK_KEY,))
+        if not cur.fetchone()[0]:
+            conn.rollback()
+            _last_flush_at = time.monotonic()
+            return {'events_flushed': 0, 'pairs_written': 0, 'max_lag_ms': 0.0, 'locked': True}
+        cur.execute(
+            """
+            DELETE FROM user_interaction_queue
+            WHERE id IN (
+                SELECT id FROM user_interaction_queue
+                ORDER BY id
+                LIMIT %s
+            )
+            RETURNING id, user_id, video_id, is_liked, is_saved,
+                      EXTRACT(EPOCH FROM LOCALTIMESTAMP - created_at) * 1000
+            """,
+            (max_rows,)
+        )
+        events = sorted(cur.fetchall())
+
+        flags: Dict[Tuple[str, int], Dict[str, bool]] = {}
+        max_lag_ms = 0.0
+        for _, user_id, video_id, is_liked, is_saved, lag_ms in events:
+            pair = flags.setdefault((user_id, video_id), {})
+            if is_liked is not None:
+                pair['is_liked'] = is_liked
+            if is_saved is not None:
+                pair['is_saved'] = is_saved
+            max_lag_ms = max(max_lag_ms, float(lag_ms or 0))
+
+        pair_deltas = set_flags_multi(cur, flags)
+        deltas: Dict[int, Dict[str, int]] = {}
+        for (_, video_id), delta in pair_deltas.items():
+            total = deltas.setdefault(video_id, {'like_delta': 0, 'save_delta': 0})
+            total['like_delta'] += delta['like_delta']
+            total['save_delta'] += delta['save_delta']
+        record_deltas(cur, deltas)
+    conn.commit()
+    _last_flush_at = time.monotonic()
+    return {
+        'events_flushed': len(events),
+        'pairs_written': len(flags),
+        'max_lag_ms': round(max_lag_ms, 1)
+    }
+
+
+def maybe_flush_interaction_queue(conn: Any, interval: float, max_rows: int) -> Optional[Dict[str, Any]]:
+    '''Flush at most once per interval per container, piggybacking on regular requests'''
+    if time.monotonic() - _last_flush_at < interval:
+        return None
+    try:
+        return flush_interaction_queue(conn, max_rows)
+    except Exception as e:
+        conn.rollback()
+        print(f'Interaction flush error: {e}')
+        return None
+
+
+def prune_idempotency_keys(conn: Any, ttl_hours: float, max_rows: int = 5000) -> int:
+    '''Forget keys older than ttl_hours, a bounded batch per call'''
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            DELETE FROM user_interaction_keys
+            WHERE (user_id, idempotency_key) IN (
+                SELECT user_id, idempotency_key FROM user_interaction_keys
+                WHERE created_at < LOCALTIMESTAMP - make_interval(secs => %s)
+                ORDER BY created_at
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            )
+            """,
+            (ttl_hours * 3600, max_rows)
+        )
+        pruned = cur.rowcount
+    conn.commit()
+    return pruned
+
+
+def queue_lag(cur: Any) -> Dict[str, Any]:
+    '''Backlog size and age of the oldest unflushed event'''
+    cur.execute(
+        """
+        SELECT COUNT(*), COALESCE(EXTRACT(EPOCH FROM LOCALTIMESTAMP - MIN(created_at)) * 1000, 0)
+        FROM user_interaction_queue
+        """
+    )
+    pending, oldest_ms = cur.fetchone()
+    return {'pending_events': int(pending), 'flush_lag_ms': round(float(oldest_ms), 1)}
+
+
+def drain_interaction_queue(conn: Any, max_rows: int = 5000, time_budget: float = 10.0) -> Dict[str, Any]:
+    '''Flush batches until the queue is empty or the time budget is spent'''
+    started = time.monotonic()
+    result = {'events_flushed': 0, 'pairs_written': 0, 'batches': 0, 'max_lag_ms': 0.0}
+    while time.monotonic() - started < time_budget:
+        flushed = flush_interaction_queue(conn, max_rows)
+        if flushed.get('locked'):
+            result['locked'] = True
+            break
+        result['events_flushed'] += flushed['events_flushed']
+        result['pairs_written'] += flushed['pairs_written']
+        result['max_lag_ms'] = max(result['max_lag_ms'], flushed['max_lag_ms'])
+        result['batches'] += 1
+        if flushed['events_flushed'] < max_rows:
+            break
+    return result
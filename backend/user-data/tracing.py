@@ -0,0 +1,211 @@
+import functools
+import json
+import os
+import random
+import re
+import threading
+import time
+from typing import Callable, Dict, Any, List, Optional
+import psycopg2.extensions
+
+# Share of invocations that are traced: 0 turns tracing off entirely, 1 traces every request
+TRACE_SAMPLE_RATE = float(os.environ.get('TRACE_SAMPLE_RATE', '0'))
+TRACE_MAX_SPANS = int(os.environ.get('TRACE_MAX_SPANS', '200'))
+
+_WHITESPACE_RE = re.compile(r'\s+')
+_local = threading.local()
+
+
+class Trace:
+    '''Spans collected for one invocation, emitted as a single JSON log line when it finishes'''
+
+    def __init__(self, function_name: str, request_id: Optional[str], method: str, action: Optional[str]):
+        self.function_name = function_name
+        self.request_id = request_id
+        self.method = method
+        self.action = action
+        self.started = time.perf_counter()
+        self.spans: List[Dict[str, Any]] = []
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def add(self, name: str, started: float, ended: float, tags: Dict[str, Any]) -> None:
+        with self._lock:
+            if len(self.spans) >= TRACE_MAX_SPANS:
+                self.dropped += 1
+                return
+            self.spans.append({
+                'name': name,
+                'start_ms': round((started - self.started) * 1000, 3),
+                'duration_ms': round((ended - started) * 1000, 3),
+                **tags
+            })
+
+    def emit(self, status: Any) -> None:
+        totals: Dict[str, Dict[str, Any]] = {}
+        for span in self.spans:
+            total = totals.setdefault(span['name'], {'count': 0, 'ms': 0.0})
+            total['count'] += 1
+            total['ms'] = round(total['ms'] + span['duration_ms'], 3)
+        print(json.dumps({
+            'type': 'trace',
+            'function': self.function_name,
+            'request_id': self.request_id,
+            'method': self.method,
+            'action': self.action,
+            'status': status,
+            'duration_ms': round((time.perf_counter() - self.started) * 1000, 3),
+            'totals': totals,
+            'spans': self.spans,
+            'dropped_spans': self.dropped
+        }, default=str))
+
+
+class _Span:
+    __slots__ = ('trace', 'name', 'tags', 'started')
+
+    def __init__(self, trace: Trace, name: str, tags: Dict[str, Any]):
+        self.trace = trace
+        self.name = name
+        self.tags = tags
+
+    def __enter__(self) -> '_Span':
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Any, tb: Any) -> None:
+        if exc_type is not None:
+            self.tags['error'] = exc_type.__name__
+        self.trace.add(self.name, self.started, time.perf_counter(), self.tags)
+
+    def tag(self, **tags: Any) -> None:
+        self.tags.update(tags)
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> '_NoopSpan':
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Any, tb: Any) -> None:
+        pass
+
+    def tag(self, **tags: Any) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def current_trace() -> Optional[Trace]:
+    return getattr(_local, 'trace', None)
+
+
+def span(name: str, **tags: Any) -> Any:
+    '''Time a block under the current trace; a shared no-op when this invocation is not sampled'''
+    trace = getattr(_local, 'trace', None)
+    if trace is None:
+        return _NOOP_SPAN
+    return _Span(trace, name, tags)
+
+
+def propagate(fn: Callable) -> Callable:
+    '''Carry the caller's trace into worker threads, e.g. around functions given to ThreadPoolExecutor.map'''
+    trace = current_trace()
+    if trace is None:
+        return fn
+
+    @functools.wraps(fn)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        _local.trace = trace
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _local.trace = None
+    return wrapper
+
+
+def traced(function_name: str) -> Callable:
+    '''
+    Decorator for handler(event, context): samples the invocation, makes its trace current
+    for spans opened anywhere below and emits one JSON line with every span when it returns
+    '''
+    def decorate(handler: Callable) -> Callable:
+        if TRACE_SAMPLE_RATE <= 0:
+            return handler
+
+        @functools.wraps(handler)
+        def wrapper(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+            if random.random() >= TRACE_SAMPLE_RATE:
+                return handler(event, context)
+            trace = Trace(function_name, getattr(context, 'request_id', None),
+                          event.get('httpMethod', 'TIMER'), request_action(event))
+            _local.trace = trace
+            status: Any = 'exception'
+            try:
+                response = handler(event, context)
+                status = response.get('statusCode') if isinstance(response, dict) else None
+                return response
+            finally:
+                _local.trace = None
+                trace.emit(status)
+        return wrapper
+    return decorate
+
+
+def request_action(event: Dict[str, Any]) -> Optional[str]:
+    '''Action name for the trace record: ?action=, or the body's action / batch key'''
+    action = (event.get('queryStringParameters') or {}).get('action')
+    if action or not event.get('body'):
+        return action
+    try:
+        body = json.loads(event['body'])
+    except ValueError:
+        return None
+    if not isinstance(body, dict):
+        return None
+    if body.get('action'):
+        return body['action']
+    return next((key for key in ('actions', 'decisions', 'tiktok_urls', 'tiktok_url', 'video_id') if key in body), None)
+
+
+def statement_label(query: Any) -> str:
+    '''Whitespace-collapsed head of the SQL text; parameters are never included'''
+    if isinstance(query, bytes):
+        query = query.decode('utf-8', 'replace')
+    return _WHITESPACE_RE.sub(' ', str(query)).strip()[:80]
+
+
+_cursor_classes: Dict[type, type] = {}
+_cursor_classes_lock = threading.Lock()
+
+
+def _traced_cursor(base: type) -> type:
+    with _cursor_classes_lock:
+        cls = _cursor_classes.get(base)
+        if cls is None:
+            def execute(self: Any, query: Any, vars: Any = None) -> Any:
+                if getattr(_local, 'trace', None) is None:
+                    return base.execute(self, query, vars)
+                with span('db.query', sql=statement_label(query)) as s:
+                    result = base.execute(self, query, vars)
+                    s.tag(rows=self.rowcount)
+                return result
+
+            cls = type(f'Traced{base.__name__}', (base,), {'execute': execute})
+            _cursor_classes[base] = cls
+        return cls
+
+
+class TracedConnection(psycopg2.extensions.connection):
+    '''Connection whose cursors record a db.query span per execute while a trace is active'''
+
+    def cursor(self, *args: Any, **kwargs: Any) -> Any:
+        base = kwargs.get('cursor_factory') or self.cursor_factory or psycopg2.extensions.cursor
+        kwargs['cursor_factory'] = _traced_cursor(base)
+        return super().cursor(*args, **kwargs)
+
+
+# Passed to psycopg2.connect by the pool; plain connections when tracing is off
+CONNECTION_FACTORY = TracedConnection if TRACE_SAMPLE_RATE > 0 else None
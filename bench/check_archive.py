@@ -0,0 +1,79 @@
+'''
+Round-trip check for the user_videos archiver against a throwaway local Postgres
+
+Archives a stale unset interaction, restores it, then runs one more archive pass and
+verifies the restored row is still live
+
+    python bench/check_archive.py --dsn postgresql://localhost/goshorts_bench
+'''
+import argparse
+import os
+import sys
+import uuid
+from typing import List, Optional
+
+import psycopg2
+
+from run import load_function
+from seed import prepare_database
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--dsn', default=os.environ.get('BENCH_DATABASE_URL'), help='throwaway Postgres database')
+    args = parser.parse_args(argv)
+    if not args.dsn:
+        parser.error('--dsn or BENCH_DATABASE_URL is required')
+
+    prepare_database(args.dsn)
+    archive = load_function('user-data').modules['archive']
+    user_id = f'archive_check_{uuid.uuid4().hex[:8]}'
+    min_age_days = 7.0
+
+    conn = psycopg2.connect(args.dsn)
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                INSERT INTO user_videos (user_id, video_id, is_liked, is_saved, updated_at)
+                VALUES (%s, 1, FALSE, FALSE, LOCALTIMESTAMP - make_interval(days => 30))
+                """,
+                (user_id,)
+            )
+        conn.commit()
+
+        def live_rows() -> int:
+            with conn.cursor() as cur:
+                cur.execute("SELECT COUNT(*) FROM user_videos WHERE user_id = %s", (user_id,))
+                count = cur.fetchone()[0]
+            conn.rollback()
+            return count
+
+        archive.archive_unset_interactions(conn, min_age_days)
+        if live_rows() != 0:
+            print('FAIL: stale unset row was not archived', file=sys.stderr)
+            return 1
+
+        with conn.cursor() as cur:
+            restored = archive.restore_interactions(cur, user_id)
+        conn.commit()
+        if restored != 1:
+            print(f'FAIL: expected 1 restored row, got {restored}', file=sys.stderr)
+            return 1
+
+        archive.archive_unset_interactions(conn, min_age_days)
+        if live_rows() != 1:
+            print('FAIL: restored row was archived again by the next pass', file=sys.stderr)
+            return 1
+        print('OK: restored row survived an archive pass')
+        return 0
+    finally:
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM user_videos WHERE user_id = %s", (user_id,))
+            cur.execute("DELETE FROM user_videos_archive WHERE user_id = %s", (user_id,))
+        conn.commit()
+        conn.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,76 @@
+'''
+Cold-import timing for a function's index module
+
+Imports backend/<function>/index.py in fresh interpreters with -X importtime, the way a
+cold container does, and reports the median wall time plus the slowest modules
+
+    python bench/cold_import.py tiktok-import --runs 10
+'''
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+
+# Modules that should stay off the feed path; reported when a cold import pulls them in anyway
+WATCHED_MODULES = ('requests', 'urllib3', 'concurrent.futures', 'logging')
+
+
+def measure(function_dir: str) -> Tuple[float, Dict[str, int]]:
+    '''One cold import: wall seconds and cumulative microseconds per top-level import'''
+    started = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import index'],
+        cwd=function_dir,
+        capture_output=True,
+        text=True,
+        check=False
+    )
+    elapsed = time.perf_counter() - started
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1] if completed.stderr else 'import failed')
+
+    cumulative: Dict[str, int] = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_us, name = line[len('import time:'):].split('|')
+        cumulative[name.strip()] = int(cumulative_us)
+    return elapsed, cumulative
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('function', nargs='?', default='tiktok-import')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--top', type=int, default=15)
+    args = parser.parse_args(argv)
+
+    function_dir = os.path.abspath(os.path.join(BACKEND_DIR, args.function))
+    walls: List[float] = []
+    totals: Dict[str, List[int]] = {}
+    for _ in range(max(1, args.runs)):
+        wall, cumulative = measure(function_dir)
+        walls.append(wall)
+        for name, us in cumulative.items():
+            totals.setdefault(name, []).append(us)
+
+    index_ms = statistics.median(totals.get('index', [0])) / 1000
+    print(f'{args.function}: median interpreter+import {statistics.median(walls) * 1000:.1f} ms, '
+          f'import index {index_ms:.1f} ms over {len(walls)} runs')
+    print(f"\n{'module':<40}{'median cumulative ms':>22}")
+    slowest = sorted(totals.items(), key=lambda item: statistics.median(item[1]), reverse=True)
+    for name, values in slowest[:args.top]:
+        print(f'{name:<40}{statistics.median(values) / 1000:>22.1f}')
+
+    loaded = [name for name in WATCHED_MODULES if name in totals]
+    print(f"\nheavy modules imported at cold start: {', '.join(loaded) if loaded else 'none'}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,492 @@
+'''
+Offline load test for the tiktok-import and user-data handlers
+
+Calls handler(event, context) in-process against a throwaway local Postgres, with the
+TikTok API replaced by a local stub, and reports p50/p95/p99 latency, throughput and
+queries per request for each endpoint
+
+    pip install -r bench/requirements.txt
+    createdb goshorts_bench
+    python bench/run.py --dsn postgresql://localhost/goshorts_bench --reset --videos 100000
+
+The database is migrated from db_migrations and, with --videos > 0, seeded with synthetic rows
+Never point --dsn at a database you care about: --reset drops the public schema
+'''
+import argparse
+import importlib
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+import psycopg2
+import psycopg2.extensions
+
+from seed import CATEGORIES, WORDS, SEED_TIKTOK_ID_BASE, prepare_database, seed_data, table_counts
+from tiktok_stub import TikTokStub
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+
+DEFAULT_MIX = 'feed=45,ranked=10,search=5,user_state=10,like=15,batch_actions=5,import=5,moderation=5'
+
+
+# ---- query counting -------------------------------------------------------
+
+_request_stats = threading.local()
+_cursor_classes: Dict[type, type] = {}
+_cursor_classes_lock = threading.Lock()
+
+
+def _count_query() -> None:
+    _request_stats.queries = getattr(_request_stats, 'queries', 0) + 1
+
+
+def _counting_cursor(base: type) -> type:
+    '''Subclass of the requested cursor class that counts round trips on the calling thread'''
+    with _cursor_classes_lock:
+        cls = _cursor_classes.get(base)
+        if cls is None:
+            def execute(self, query, vars=None):
+                _count_query()
+                return base.execute(self, query, vars)
+
+            def executemany(self, query, vars_list):
+                _count_query()
+                return base.executemany(self, query, vars_list)
+
+            cls = type(f'Counting{base.__name__}', (base,), {'execute': execute, 'executemany': executemany})
+            _cursor_classes[base] = cls
+        return cls
+
+
+class CountingConnection(psycopg2.extensions.connection):
+    def cursor(self, *args: Any, **kwargs: Any) -> Any:
+        base = kwargs.get('cursor_factory') or self.cursor_factory or psycopg2.extensions.cursor
+        kwargs['cursor_factory'] = _counting_cursor(base)
+        return super().cursor(*args, **kwargs)
+
+
+def instrument_psycopg2() -> None:
+    '''
+    Make every new psycopg2 connection count its statements
+    Only the connection class changes; queries still go to the real server
+    '''
+    connect = psycopg2.connect
+    factories: Dict[type, type] = {}
+
+    def counting_connect(*args: Any, **kwargs: Any) -> Any:
+        # The pools pass their own factory (tracing) which may be None; layer counting on top of it
+        base = kwargs.get('connection_factory')
+        if base is None or base is psycopg2.extensions.connection:
+            kwargs['connection_factory'] = CountingConnection
+        else:
+            if base not in factories:
+                factories[base] = type(f'Counting{base.__name__}', (CountingConnection, base), {})
+            kwargs['connection_factory'] = factories[base]
+        return connect(*args, **kwargs)
+
+    psycopg2.connect = counting_connect
+
+
+# ---- handler loading ------------------------------------------------------
+
+# Modules that a handler imports lazily at call time, left in sys.modules for the run: name -> function
+_resident_modules: Dict[str, str] = {}
+
+
+def load_function(name: str) -> SimpleNamespace:
+    '''
+    Import backend/<name>/index.py the way the platform does, with its directory on sys.path
+    Both functions ship modules called index and db, so each is loaded in isolation
+    and its modules are kept on the returned namespace instead of in sys.modules.
+    Every other local module is pre-loaded too; the ones index does not import at load time
+    (deferred imports such as tiktok_client) stay in sys.modules so calls can still reach them
+    '''
+    function_dir = os.path.abspath(os.path.join(BACKEND_DIR, name))
+    local_names = {f[:-3] for f in os.listdir(function_dir) if f.endswith('.py')}
+    for module_name in local_names:
+        sys.modules.pop(module_name, None)
+
+    sys.path.insert(0, function_dir)
+    try:
+        index = importlib.import_module('index')
+        deferred = {module_name for module_name in local_names if module_name not in sys.modules}
+        for module_name in sorted(deferred):
+            importlib.import_module(module_name)
+        modules = {module_name: sys.modules[module_name] for module_name in local_names if module_name in sys.modules}
+    finally:
+        sys.path.remove(function_dir)
+        for module_name in local_names:
+            sys.modules.pop(module_name, None)
+
+    for module_name in sorted(deferred):
+        owner = _resident_modules.setdefault(module_name, name)
+        if owner != name:
+            raise RuntimeError(f'{name} and {owner} both import a module called {module_name} lazily')
+        sys.modules[module_name] = modules[module_name]
+    return SimpleNamespace(name=name, handler=index.handler, modules=modules)
+
+
+# ---- traffic --------------------------------------------------------------
+
+class Traffic:
+    '''
+    Realistic request sequences per scenario
+    Each scenario is a generator that yields (endpoint, function, event) and is sent back the response,
+    so multi-step flows such as claim-then-decide can use what the previous call returned
+    '''
+
+    def __init__(self, users: int, import_id_start: int):
+        self.users = max(1, users)
+        self._import_ids = iter(range(import_id_start, import_id_start + 10 ** 9))
+        self._import_lock = threading.Lock()
+        self._feed_cursors: Dict[Optional[str], str] = {}
+        self._cursor_lock = threading.Lock()
+        self.video_ids: List[int] = []
+
+    def user(self) -> str:
+        return f'bench_user_{random.randint(1, self.users)}'
+
+    def video_id(self) -> int:
+        return random.choice(self.video_ids) if self.video_ids else random.randint(1, 1000)
+
+    def next_tiktok_url(self) -> str:
+        with self._import_lock:
+            tiktok_id = next(self._import_ids)
+        return f'https://www.tiktok.com/@bench_import/video/{tiktok_id}'
+
+    def remember_cursor(self, category: Optional[str], cursor: Optional[str]) -> None:
+        with self._cursor_lock:
+            if cursor:
+                self._feed_cursors[category] = cursor
+            else:
+                self._feed_cursors.pop(category, None)
+
+    def scenarios(self) -> Dict[str, Callable[[], Any]]:
+        return {
+            'feed': self.feed,
+            'ranked': self.ranked,
+            'search': self.search,
+            'user_state': self.user_state,
+            'like': self.like,
+            'batch_actions': self.batch_actions,
+            'import': self.import_video,
+            'moderation': self.moderation
+        }
+
+    def feed(self) -> Any:
+        category = random.choice((None, None, None) + CATEGORIES)
+        params = {'limit': '20'}
+        if category:
+            params['category'] = category
+        with self._cursor_lock:
+            cursor = self._feed_cursors.get(category)
+        if cursor and random.random() < 0.5:
+            params['cursor'] = cursor
+        response = yield 'feed', 'tiktok-import', http_event('GET', self.user(), params)
+        if response.get('statusCode') == 200:
+            self.remember_cursor(category, json.loads(response['body']).get('next_cursor'))
+
+    def ranked(self) -> Any:
+        yield 'ranked', 'tiktok-import', http_event('GET', self.user(), {'action': 'ranked', 'limit': '20'})
+
+    def search(self) -> Any:
+        params = {'action': 'search', 'limit': '20'}
+        if random.random() < 0.7:
+            params['q'] = random.choice(WORDS)
+        else:
+            params['tag'] = random.choice(CATEGORIES)
+        yield 'search', 'tiktok-import', http_event('GET', self.user(), params)
+
+    def user_state(self) -> Any:
+        yield 'user_state', 'user-data', http_event('GET', self.user(), {'limit': '30'})
+
+    def like(self) -> Any:
+        body = {'action': random.choice(('like_video', 'save_video')), 'video_id': self.video_id()}
+        body['is_liked' if body['action'] == 'like_video' else 'is_saved'] = random.random() < 0.8
+        yield 'like', 'user-data', http_event('POST', self.user(), body=body)
+
+    def batch_actions(self) -> Any:
+        actions = [
+            {'action': 'like_video', 'video_id': self.video_id(), 'is_liked': random.random() < 0.8}
+            for _ in range(10)
+        ]
+        yield 'batch_actions', 'user-data', http_event('POST', self.user(), body={'actions': actions})
+
+    def import_video(self) -> Any:
+        if random.random() < 0.2:
+            urls = [self.next_tiktok_url() for _ in range(10)]
+            yield 'import_batch', 'tiktok-import', http_event('POST', self.user(), body={'tiktok_urls': urls})
+        else:
+            yield 'import', 'tiktok-import', http_event('POST', self.user(), body={'tiktok_url': self.next_tiktok_url()})
+
+    def moderation(self) -> Any:
+        moderator = f'bench_moderator_{random.randint(1, 5)}'
+        response = yield 'moderation_claim', 'tiktok-import', http_event(
+            'POST', moderator, body={'action': 'claim', 'limit': 10, 'lease_seconds': 60}
+        )
+        if response.get('statusCode') != 200:
+            return
+        claimed = json.loads(response['body']).get('videos', [])
+        if not claimed:
+            return
+        decisions = [
+            {'video_id': video['id'], 'action': random.choice(('approve', 'approve', 'approve', 'reject'))}
+            for video in claimed
+        ]
+        yield 'moderation_decide', 'tiktok-import', http_event('PUT', moderator, body={'decisions': decisions})
+
+
+def http_event(method: str, user_id: str, params: Optional[Dict[str, str]] = None,
+               body: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    event: Dict[str, Any] = {
+        'httpMethod': method,
+        'headers': {'X-User-Id': user_id, 'Content-Type': 'application/json'},
+        'queryStringParameters': params or {},
+        'isBase64Encoded': False
+    }
+    if body is not None:
+        event['body'] = json.dumps(body)
+    return event
+
+
+# ---- runner ---------------------------------------------------------------
+
+class Recorder:
+    def __init__(self):
+        self.samples: Dict[str, List[Tuple[float, int, int]]] = {}
+        self.exceptions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def add(self, endpoint: str, elapsed_ms: float, status: int, queries: int) -> None:
+        with self._lock:
+            self.samples.setdefault(endpoint, []).append((elapsed_ms, status, queries))
+
+    def add_exception(self, endpoint: str, error: Exception) -> None:
+        with self._lock:
+            if endpoint not in self.exceptions:
+                print(f'{endpoint}: {type(error).__name__}: {error}', file=sys.stderr)
+            self.exceptions[endpoint] = self.exceptions.get(endpoint, 0) + 1
+
+
+def run_scenario(scenario: Callable[[], Any], functions: Dict[str, SimpleNamespace],
+                 recorder: Optional[Recorder]) -> None:
+    steps = scenario()
+    response: Dict[str, Any] = {}
+    try:
+        endpoint, function_name, event = next(steps)
+        while True:
+            context = SimpleNamespace(request_id=str(uuid.uuid4()), function_name=function_name)
+            _request_stats.queries = 0
+            started = time.perf_counter()
+            try:
+                response = functions[function_name].handler(event, context)
+            except Exception as e:
+                if recorder is not None:
+                    recorder.add_exception(endpoint, e)
+                return
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            if recorder is not None:
+                recorder.add(endpoint, elapsed_ms, response.get('statusCode', 0), _request_stats.queries)
+            endpoint, function_name, event = steps.send(response)
+    except StopIteration:
+        pass
+
+
+def run_load(functions: Dict[str, SimpleNamespace], traffic: Traffic, mix: Dict[str, float],
+             concurrency: int, duration: float, warmup: float, max_requests: Optional[int]) -> Tuple[Recorder, float]:
+    '''
+    Closed-loop load: each worker runs scenarios back to back until the deadline
+    Samples taken during the warmup window are discarded
+    '''
+    scenarios = traffic.scenarios()
+    names = [name for name in mix if mix[name] > 0]
+    weights = [mix[name] for name in names]
+    recorder = Recorder()
+    started = time.monotonic()
+    measure_from = started + warmup
+    deadline = measure_from + duration
+    issued = [0]
+    issued_lock = threading.Lock()
+
+    def worker() -> None:
+        while time.monotonic() < deadline:
+            if max_requests is not None:
+                with issued_lock:
+                    if issued[0] >= max_requests:
+                        return
+                    issued[0] += 1
+            name = random.choices(names, weights)[0]
+            run_scenario(scenarios[name], functions, recorder if time.monotonic() >= measure_from else None)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for future in [executor.submit(worker) for _ in range(concurrency)]:
+            future.result()
+    return recorder, max(0.001, time.monotonic() - max(measure_from, started))
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    '''Nearest-rank percentile of an already sorted list'''
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(recorder: Recorder, elapsed: float) -> Dict[str, Any]:
+    endpoints = {}
+    all_latencies: List[float] = []
+    for endpoint in sorted(set(recorder.samples) | set(recorder.exceptions)):
+        samples = recorder.samples.get(endpoint, [])
+        latencies = sorted(s[0] for s in samples)
+        all_latencies.extend(latencies)
+        endpoints[endpoint] = {
+            'requests': len(samples),
+            'rps': round(len(samples) / elapsed, 1),
+            'p50_ms': round(percentile(latencies, 50), 2),
+            'p95_ms': round(percentile(latencies, 95), 2),
+            'p99_ms': round(percentile(latencies, 99), 2),
+            'max_ms': round(latencies[-1], 2) if latencies else 0.0,
+            'queries_per_request': round(sum(s[2] for s in samples) / len(samples), 2) if samples else 0.0,
+            'status_4xx': sum(1 for s in samples if 400 <= s[1] < 500),
+            'status_5xx': sum(1 for s in samples if s[1] >= 500),
+            'exceptions': recorder.exceptions.get(endpoint, 0)
+        }
+    all_latencies.sort()
+    return {
+        'elapsed_s': round(elapsed, 2),
+        'total': {
+            'requests': len(all_latencies),
+            'rps': round(len(all_latencies) / elapsed, 1),
+            'p50_ms': round(percentile(all_latencies, 50), 2),
+            'p95_ms': round(percentile(all_latencies, 95), 2),
+            'p99_ms': round(percentile(all_latencies, 99), 2)
+        },
+        'endpoints': endpoints
+    }
+
+
+def print_report(summary: Dict[str, Any]) -> None:
+    header = f"{'endpoint':<18}{'reqs':>8}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}{'q/req':>7}{'4xx':>6}{'5xx':>6}{'exc':>6}"
+    print(header)
+    print('-' * len(header))
+    for endpoint, row in summary['endpoints'].items():
+        print(
+            f"{endpoint:<18}{row['requests']:>8}{row['rps']:>9}{row['p50_ms']:>9}{row['p95_ms']:>9}"
+            f"{row['p99_ms']:>9}{row['max_ms']:>9}{row['queries_per_request']:>7}"
+            f"{row['status_4xx']:>6}{row['status_5xx']:>6}{row['exceptions']:>6}"
+        )
+    total = summary['total']
+    print('-' * len(header))
+    print(f"{'total':<18}{total['requests']:>8}{total['rps']:>9}{total['p50_ms']:>9}{total['p95_ms']:>9}{total['p99_ms']:>9}")
+    print(f"latencies in ms over {summary['elapsed_s']}s")
+
+
+def parse_mix(raw: str) -> Dict[str, float]:
+    known = Traffic(1, 0).scenarios()
+    mix = {}
+    for part in raw.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in known:
+            raise argparse.ArgumentTypeError(f'unknown scenario {name!r}, expected one of: {", ".join(known)}')
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def load_video_ids(dsn: str, limit: int = 50_000) -> List[int]:
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT id FROM tiktok_videos WHERE is_active = TRUE AND moderation_status = 'approved' ORDER BY random() LIMIT %s",
+                (limit,)
+            )
+            ids = [row[0] for row in cur.fetchall()]
+        conn.rollback()
+        return ids
+    finally:
+        conn.close()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--dsn', default=os.environ.get('BENCH_DATABASE_URL'), help='throwaway Postgres database')
+    parser.add_argument('--reset', action='store_true', help='drop and re-create the public schema first')
+    parser.add_argument('--videos', type=int, default=0, help='synthetic tiktok_videos rows to add (10k to 10M)')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--interactions-per-user', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=30.0, help='measured seconds')
+    parser.add_argument('--warmup', type=float, default=5.0, help='unmeasured seconds before the run')
+    parser.add_argument('--requests', type=int, default=None, help='stop after this many scenarios')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX))
+    parser.add_argument('--stub-latency-ms', type=float, default=80.0)
+    parser.add_argument('--stub-error-rate', type=float, default=0.0)
+    parser.add_argument('--no-response-cache', action='store_true', help='disable the feed response cache')
+    parser.add_argument('--seed', type=int, default=None, help='random seed for the traffic mix')
+    parser.add_argument('--json', dest='json_path', help='also write the summary to this file')
+    args = parser.parse_args(argv)
+
+    if not args.dsn:
+        parser.error('--dsn or BENCH_DATABASE_URL is required')
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    stub = TikTokStub(latency_ms=args.stub_latency_ms, error_rate=args.stub_error_rate).start()
+
+    # Handlers read their configuration at import time, so the environment is set first
+    os.environ['DATABASE_URL'] = args.dsn
+    os.environ['TIKTOK_API_BASE_URL'] = stub.base_url
+    os.environ.setdefault('TIKTOK_CLIENT_KEY', 'bench')
+    os.environ.setdefault('TIKTOK_API_RATE', '1000')
+    os.environ.setdefault('TIKTOK_API_BURST', '1000')
+    os.environ.setdefault('DB_POOL_MAX_SIZE', str(args.concurrency))
+    if args.no_response_cache:
+        os.environ['FEED_CACHE_TTL'] = '0'
+
+    applied = prepare_database(args.dsn, reset=args.reset)
+    if applied:
+        print(f'applied {len(applied)} migrations')
+    if args.videos:
+        print(f'seeding {args.videos} videos for {args.users} users...')
+        print(seed_data(args.dsn, args.videos, args.users, args.interactions_per_user))
+    print(table_counts(args.dsn))
+
+    instrument_psycopg2()
+    functions = {name: load_function(name) for name in ('tiktok-import', 'user-data')}
+
+    traffic = Traffic(args.users, SEED_TIKTOK_ID_BASE + 5 * 10 ** 17 + random.randint(0, 10 ** 15))
+    traffic.video_ids = load_video_ids(args.dsn)
+
+    print(f'running {args.concurrency} workers for {args.warmup}s warmup + {args.duration}s...')
+    recorder, elapsed = run_load(functions, traffic, args.mix, args.concurrency,
+                                 args.duration, args.warmup, args.requests)
+    summary = summarize(recorder, elapsed)
+    summary['config'] = {
+        'concurrency': args.concurrency,
+        'mix': args.mix,
+        'response_cache': not args.no_response_cache,
+        'stub_latency_ms': args.stub_latency_ms,
+        'tables': table_counts(args.dsn)
+    }
+    summary['tiktok_stub'] = stub.stats()
+    summary['pools'] = {name: fn.modules['db'].get_pool().stats() for name, fn in functions.items()}
+    stub.stop()
+
+    print_report(summary)
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
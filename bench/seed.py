@@ -0,0 +1,234 @@
+import os
+import time
+from typing import Dict, Any, List, Tuple
+
+import psycopg2
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'db_migrations')
+
+CATEGORIES = ('general', 'funny', 'dance', 'food', 'travel', 'sports', 'pets', 'education')
+
+# Shared with the traffic generator so search queries actually hit seeded descriptions
+WORDS = ('кот', 'танец', 'рецепт', 'горы', 'футбол', 'урок', 'пицца', 'море',
+         'cat', 'dance', 'recipe', 'mountains', 'football', 'lesson', 'pizza', 'sea')
+
+# Synthetic TikTok ids start here so imports during the run never collide with seeded urls
+SEED_TIKTOK_ID_BASE = 7_000_000_000_000_000_000
+
+
+def prepare_database(dsn: str, reset: bool = False) -> List[str]:
+    '''
+    Bring a throwaway database up to the current schema by running db_migrations in order
+    reset=True drops the public schema first; applied files are tracked in bench_migrations
+    '''
+    conn = psycopg2.connect(dsn)
+    conn.autocommit = True
+    applied: List[str] = []
+    try:
+        with conn.cursor() as cur:
+            if reset:
+                cur.execute("DROP SCHEMA public CASCADE")
+                cur.execute("CREATE SCHEMA public")
+            cur.execute("CREATE TABLE IF NOT EXISTS bench_migrations (name TEXT PRIMARY KEY)")
+            cur.execute("SELECT name FROM bench_migrations")
+            done = {row[0] for row in cur.fetchall()}
+
+            for name in sorted(os.listdir(MIGRATIONS_DIR), key=migration_version):
+                if not name.endswith('.sql') or name in done:
+                    continue
+                with open(os.path.join(MIGRATIONS_DIR, name), encoding='utf-8') as f:
+                    # One statement at a time: CREATE INDEX CONCURRENTLY refuses to run in a transaction block
+                    for statement in split_sql(f.read()):
+                        cur.execute(statement)
+                cur.execute("INSERT INTO bench_migrations (name) VALUES (%s)", (name,))
+                applied.append(name)
+    finally:
+        conn.close()
+    return applied
+
+
+def migration_version(name: str) -> Tuple[int, ...]:
+    '''V0015_1__x.sql -> (15, 1): sub-versions sort after their base version, as the deploy runner orders them'''
+    version = name[1:].split('__', 1)[0]
+    return tuple(int(part) for part in version.replace('.', '_').split('_') if part.isdigit())
+
+
+def split_sql(script: str) -> List[str]:
+    '''Split a migration into statements, respecting quotes, $$ bodies and -- comments'''
+    statements = []
+    current = []
+    i = 0
+    in_quote = in_dollar = False
+    while i < len(script):
+        ch = script[i]
+        if not in_quote and not in_dollar and script.startswith('--', i):
+            end = script.find('\n', i)
+            i = len(script) if end == -1 else end
+            continue
+        if not in_quote and script.startswith('$$', i):
+            in_dollar = not in_dollar
+            current.append('$$')
+            i += 2
+            continue
+        if not in_dollar and ch == "'":
+            in_quote = not in_quote
+        if ch == ';' and not in_quote and not in_dollar:
+            statement = ''.join(current).strip()
+            if statement:
+                statements.append(statement)
+            current = []
+        else:
+            current.append(ch)
+        i += 1
+    statement = ''.join(current).strip()
+    if statement:
+        statements.append(statement)
+    return statements
+
+
+def seed_data(dsn: str, videos: int, users: int, interactions_per_user: int,
+              chunk_size: int = 100_000) -> Dict[str, Any]:
+    '''
+    Fill tiktok_videos and user_videos with synthetic rows, then rebuild the derived tables
+    Rows are generated server-side with generate_series and committed per chunk,
+    so 10M videos stream in without building anything large on the client
+    Roughly 5% of videos are pending and 2% rejected, the rest approved
+    '''
+    started = time.monotonic()
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT COALESCE(MAX(id), 0) FROM tiktok_videos")
+            first_video = cur.fetchone()[0] + 1
+        conn.commit()
+
+        for start in range(0, videos, chunk_size):
+            count = min(chunk_size, videos - start)
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    INSERT INTO tiktok_videos (
+                        tiktok_url, video_url, author, author_avatar, description,
+                        likes, comments, shares, views, hashtags, category,
+                        moderation_status, is_active, created_at, updated_at
+                    )
+                    SELECT
+                        'https://www.tiktok.com/@bench' || (n %% 5000) || '/video/' || (%(base)s::numeric + n),
+                        'https://www.tiktok.com/embed/v2/' || (%(base)s::numeric + n),
+                        '@bench' || (n %% 5000),
+                        NULL,
+                        'Synthetic video ' || n || ' ' || (%(words)s::text[])[1 + n %% %(word_count)s] || ' '
+                            || (%(words)s::text[])[1 + (n / 7) %% %(word_count)s] || ' #' || (%(categories)s::text[])[1 + n %% 8],
+                        (random() * 100000)::int,
+                        (random() * 5000)::int,
+                        (random() * 2000)::int,
+                        (random() * 2000000)::int,
+                        ARRAY[(%(categories)s::text[])[1 + n %% 8], 'bench', 'tag' || (n %% 100)],
+                        (%(categories)s::text[])[1 + (n / 3) %% 8],
+                        CASE WHEN n %% 20 = 0 THEN 'pending' WHEN n %% 50 = 1 THEN 'rejected' ELSE 'approved' END,
+                        n %% 50 <> 1,
+                        LOCALTIMESTAMP - make_interval(secs => random() * 86400 * 180),
+                        LOCALTIMESTAMP - make_interval(secs => random() * 86400 * 7)
+                    FROM generate_series(%(start)s, %(stop)s) AS n
+                    ON CONFLICT (tiktok_url) DO NOTHING
+                    """,
+                    {
+                        'base': SEED_TIKTOK_ID_BASE,
+                        'words': list(WORDS),
+                        'word_count': len(WORDS),
+                        'categories': list(CATEGORIES),
+                        'start': first_video + start,
+                        'stop': first_video + start + count - 1
+                    }
+                )
+            conn.commit()
+
+        with conn.cursor() as cur:
+            cur.execute("SELECT MIN(id), MAX(id) FROM tiktok_videos")
+            min_id, max_id = cur.fetchone()
+        conn.commit()
+
+        users_per_chunk = max(1, chunk_size // max(1, interactions_per_user))
+        for start in range(0, users if min_id else 0, users_per_chunk):
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    INSERT INTO user_videos (user_id, video_id, is_liked, is_saved, updated_at)
+                    SELECT 'bench_user_' || u,
+                           %(min_id)s + ((u::bigint * 7919 + k::bigint * 104729) %% %(span)s),
+                           random() < 0.7,
+                           random() < 0.3,
+                           LOCALTIMESTAMP - make_interval(secs => random() * 86400 * 30)
+                    FROM generate_series(%(start)s, %(stop)s) AS u
+                    CROSS JOIN generate_series(1, %(per_user)s) AS k
+                    ON CONFLICT (user_id, video_id) DO NOTHING
+                    """,
+                    {
+                        'min_id': min_id,
+                        'span': max_id - min_id + 1,
+                        'start': start + 1,
+                        'stop': min(users, start + users_per_chunk),
+                        'per_user': interactions_per_user
+                    }
+                )
+            conn.commit()
+
+        rebuild_derived_tables(conn)
+    finally:
+        conn.close()
+    return {'videos': videos, 'users': users, 'elapsed_s': round(time.monotonic() - started, 1)}
+
+
+def rebuild_derived_tables(conn: Any) -> None:
+    '''Recompute counters and scores the way their migrations backfill them, then refresh planner stats'''
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO video_counters (video_id, app_likes, app_saves)
+            SELECT video_id,
+                   COUNT(*) FILTER (WHERE is_liked = TRUE),
+                   COUNT(*) FILTER (WHERE is_saved = TRUE)
+            FROM user_videos
+            GROUP BY video_id
+            ON CONFLICT (video_id)
+            DO UPDATE SET app_likes = EXCLUDED.app_likes, app_saves = EXCLUDED.app_saves
+            """
+        )
+        cur.execute(
+            """
+            INSERT INTO video_scores (video_id, category, score)
+            SELECT id, COALESCE(category, 'general'), video_hot_score(likes, comments, shares, views, created_at)
+            FROM tiktok_videos
+            WHERE is_active = TRUE AND moderation_status = 'approved'
+            ON CONFLICT (video_id) DO UPDATE SET category = EXCLUDED.category, score = EXCLUDED.score
+            """
+        )
+        cur.execute(
+            """
+            INSERT INTO video_scores_state (id, refreshed_through)
+            SELECT 1, COALESCE(MAX(updated_at), LOCALTIMESTAMP) FROM tiktok_videos
+            ON CONFLICT (id) DO UPDATE SET refreshed_through = EXCLUDED.refreshed_through
+            """
+        )
+    conn.commit()
+
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            cur.execute("ANALYZE")
+    finally:
+        conn.autocommit = False
+
+
+def table_counts(dsn: str) -> Dict[str, int]:
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn.cursor() as cur:
+            counts = {}
+            for table in ('tiktok_videos', 'user_videos', 'video_scores', 'video_counters'):
+                cur.execute(f"SELECT COUNT(*) FROM {table}")
+                counts[table] = cur.fetchone()[0]
+        conn.rollback()
+        return counts
+    finally:
+        conn.close()
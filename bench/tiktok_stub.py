@@ -0,0 +1,96 @@
+import json
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, Optional, Tuple
+from urllib.parse import urlparse, parse_qs
+
+
+class TikTokStub:
+    '''
+    Local stand-in for the TikTok video query API
+    Answers GET /v2/video/query/?video_id=... with deterministic metadata, after an optional
+    latency, and a configurable share of 429s so the client's retry path is exercised too
+    '''
+
+    def __init__(self, latency_ms: float = 80.0, jitter_ms: float = 40.0, error_rate: float = 0.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.requests = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self) -> 'TikTokStub':
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                status, payload = stub.respond(self.path)
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                if status == 429:
+                    self.send_header('Retry-After', '0')
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def respond(self, path: str) -> Tuple[int, Dict[str, Any]]:
+        parsed = urlparse(path)
+        if parsed.path.rstrip('/') != '/v2/video/query':
+            return 404, {'error': {'code': 'not_found'}}
+
+        with self._lock:
+            self.requests += 1
+        delay = max(0.0, self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms))
+        time.sleep(delay / 1000)
+
+        if self.error_rate and random.random() < self.error_rate:
+            with self._lock:
+                self.errors += 1
+            return 429, {'error': {'code': 'rate_limit_exceeded'}}
+
+        video_id = (parse_qs(parsed.query).get('video_id') or [''])[0]
+        return 200, {'data': {'video': fake_video(video_id)}}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'requests': self.requests, 'errors': self.errors}
+
+
+def fake_video(video_id: str) -> Dict[str, Any]:
+    '''Stable metadata per video id, so repeated fetches look like the same video'''
+    seed = zlib.crc32(video_id.encode())
+    rng = random.Random(seed)
+    views = rng.randint(1_000, 5_000_000)
+    return {
+        'id': video_id,
+        'description': f'Stub video {video_id} #bench #{rng.choice(["dance", "food", "pets", "travel"])}',
+        'author_avatar_url': f'https://example.invalid/avatars/{seed % 1000}.jpg',
+        'view_count': views,
+        'like_count': views // rng.randint(5, 50),
+        'comment_count': views // rng.randint(200, 2000),
+        'share_count': views // rng.randint(500, 5000)
+    }
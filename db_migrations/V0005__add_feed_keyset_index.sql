@@ -0,0 +1,8 @@
+-- Composite indexes backing keyset pagination of the approved feed
+-- (created_at, id) is the cursor, so both columns must be in the index order
+CREATE INDEX IF NOT EXISTS idx_tiktok_videos_feed_category_keyset
+    ON tiktok_videos(moderation_status, is_active, category, created_at DESC, id DESC);
+
+-- Same ordering for the unfiltered "all categories" feed
+CREATE INDEX IF NOT EXISTS idx_tiktok_videos_feed_keyset
+    ON tiktok_videos(moderation_status, is_active, created_at DESC, id DESC);
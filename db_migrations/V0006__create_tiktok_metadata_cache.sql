@@ -0,0 +1,8 @@
+-- Shared cache of TikTok API video metadata, keyed by TikTok video id
+CREATE TABLE IF NOT EXISTS tiktok_metadata_cache (
+    video_id VARCHAR(64) PRIMARY KEY,
+    metadata JSONB NOT NULL,
+    fetched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_tiktok_metadata_cache_fetched ON tiktok_metadata_cache(fetched_at);
@@ -0,0 +1,4 @@
+-- Stalest-first scan of approved videos for the engagement stats refresher
+CREATE INDEX IF NOT EXISTS idx_tiktok_videos_stats_refresh
+    ON tiktok_videos(updated_at, id)
+    WHERE is_active = TRUE AND moderation_status = 'approved';
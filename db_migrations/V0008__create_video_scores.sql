@@ -0,0 +1,37 @@
+-- Precomputed ranking scores for the "for you" feed
+-- Time decay is folded into the score as a created_at offset (log-engagement + age),
+-- so a video's score only changes when its engagement changes and refreshes stay incremental
+CREATE OR REPLACE FUNCTION video_hot_score(likes INTEGER, comments INTEGER, shares INTEGER, views INTEGER, created_at TIMESTAMP)
+RETURNS DOUBLE PRECISION AS $$
+    SELECT LOG(GREATEST(COALESCE(likes, 0) + 2 * COALESCE(comments, 0) + 3 * COALESCE(shares, 0) + COALESCE(views, 0) / 10.0, 1))
+           + EXTRACT(EPOCH FROM created_at) / 45000.0
+$$ LANGUAGE SQL IMMUTABLE;
+
+CREATE TABLE IF NOT EXISTS video_scores (
+    video_id INTEGER PRIMARY KEY,
+    category VARCHAR(100) NOT NULL DEFAULT 'general',
+    score DOUBLE PRECISION NOT NULL,
+    computed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_video_scores_score ON video_scores(score DESC, video_id DESC);
+CREATE INDEX IF NOT EXISTS idx_video_scores_category_score ON video_scores(category, score DESC, video_id DESC);
+
+-- Single-row watermark for incremental refreshes
+CREATE TABLE IF NOT EXISTS video_scores_state (
+    id INTEGER PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    refreshed_through TIMESTAMP NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_tiktok_videos_updated ON tiktok_videos(updated_at);
+CREATE INDEX IF NOT EXISTS idx_user_videos_liked ON user_videos(user_id, video_id) WHERE is_liked = TRUE;
+
+INSERT INTO video_scores (video_id, category, score)
+SELECT id, COALESCE(category, 'general'), video_hot_score(likes, comments, shares, views, created_at)
+FROM tiktok_videos
+WHERE is_active = TRUE AND moderation_status = 'approved'
+ON CONFLICT (video_id) DO NOTHING;
+
+INSERT INTO video_scores_state (id, refreshed_through)
+SELECT 1, COALESCE(MAX(updated_at), CURRENT_TIMESTAMP) FROM tiktok_videos
+ON CONFLICT (id) DO NOTHING;
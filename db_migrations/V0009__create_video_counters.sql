@@ -0,0 +1,24 @@
+-- In-app like/save counters per video, kept current from batched deltas
+CREATE TABLE IF NOT EXISTS video_counters (
+    video_id INTEGER PRIMARY KEY,
+    app_likes BIGINT NOT NULL DEFAULT 0,
+    app_saves BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Append-only delta log: writers never touch the counter row, so viral videos do not serialize on it
+CREATE TABLE IF NOT EXISTS video_counter_deltas (
+    id BIGSERIAL PRIMARY KEY,
+    video_id INTEGER NOT NULL,
+    like_delta SMALLINT NOT NULL DEFAULT 0,
+    save_delta SMALLINT NOT NULL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO video_counters (video_id, app_likes, app_saves)
+SELECT video_id,
+       COUNT(*) FILTER (WHERE is_liked = TRUE),
+       COUNT(*) FILTER (WHERE is_saved = TRUE)
+FROM user_videos
+GROUP BY video_id
+ON CONFLICT (video_id) DO NOTHING;
@@ -0,0 +1,8 @@
+-- Keyset paging of a user's liked and saved lists, newest interaction first
+CREATE INDEX IF NOT EXISTS idx_user_videos_liked_recent
+    ON user_videos(user_id, updated_at DESC, video_id DESC)
+    WHERE is_liked = TRUE;
+
+CREATE INDEX IF NOT EXISTS idx_user_videos_saved_recent
+    ON user_videos(user_id, updated_at DESC, video_id DESC)
+    WHERE is_saved = TRUE;
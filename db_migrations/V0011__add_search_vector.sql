@@ -0,0 +1,23 @@
+-- Full-text search over author and description
+-- The column is added nullable and filled by a trigger for new writes; existing rows are
+-- backfilled in small batches by the tiktok-import backfill_search job, so no long table lock
+CREATE OR REPLACE FUNCTION tiktok_video_search_vector(author TEXT, description TEXT)
+RETURNS tsvector AS $$
+    SELECT setweight(to_tsvector('simple', COALESCE(author, '')), 'A')
+        || setweight(to_tsvector('simple', COALESCE(description, '')), 'B')
+$$ LANGUAGE SQL IMMUTABLE;
+
+ALTER TABLE tiktok_videos ADD COLUMN IF NOT EXISTS search_vector tsvector;
+
+CREATE OR REPLACE FUNCTION tiktok_videos_search_vector_trigger()
+RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := tiktok_video_search_vector(NEW.author, NEW.description);
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_tiktok_videos_search_vector ON tiktok_videos;
+CREATE TRIGGER trg_tiktok_videos_search_vector
+    BEFORE INSERT OR UPDATE OF author, description ON tiktok_videos
+    FOR EACH ROW EXECUTE FUNCTION tiktok_videos_search_vector_trigger();
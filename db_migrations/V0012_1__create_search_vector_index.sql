@@ -0,0 +1,3 @@
+-- Non-transactional on its own, like V0012
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_tiktok_videos_search_vector
+    ON tiktok_videos USING GIN (search_vector);
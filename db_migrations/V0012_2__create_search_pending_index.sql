@@ -0,0 +1,5 @@
+-- Non-transactional on its own, like V0012.
+-- Lets the backfill job find unfilled rows without scanning the table
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_tiktok_videos_search_pending
+    ON tiktok_videos(id)
+    WHERE search_vector IS NULL;
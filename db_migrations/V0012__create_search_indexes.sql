@@ -0,0 +1,5 @@
+-- CREATE INDEX CONCURRENTLY cannot run inside a transaction block, so each search index gets a
+-- migration holding that one statement and nothing else; the runner applies such files outside a
+-- transaction, and reads and writes continue while the index builds
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_tiktok_videos_hashtags
+    ON tiktok_videos USING GIN (hashtags);
@@ -0,0 +1,8 @@
+-- Lease-based claiming so several moderators can work the pending queue without overlap
+ALTER TABLE tiktok_videos ADD COLUMN IF NOT EXISTS claimed_by VARCHAR(255);
+ALTER TABLE tiktok_videos ADD COLUMN IF NOT EXISTS claim_expires_at TIMESTAMP;
+
+-- Only pending rows are indexed, so the queue index stays small however large the catalog is
+CREATE INDEX IF NOT EXISTS idx_tiktok_videos_pending_queue
+    ON tiktok_videos(created_at, id)
+    WHERE is_active = TRUE AND moderation_status = 'pending';
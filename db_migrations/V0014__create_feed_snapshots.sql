@@ -0,0 +1,12 @@
+-- Ready-to-serve first pages of every category feed; feed '*' is the unfiltered feed.
+-- page_cursor is the cursor a client sends for that page ('' for the first), so a read is one primary-key lookup
+CREATE TABLE IF NOT EXISTS feed_snapshots (
+    feed VARCHAR(100) NOT NULL,
+    page_cursor TEXT NOT NULL DEFAULT '',
+    page INTEGER NOT NULL,
+    page_size INTEGER NOT NULL,
+    body TEXT NOT NULL,
+    etag VARCHAR(64) NOT NULL,
+    built_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (feed, page_cursor)
+);
@@ -0,0 +1,6 @@
+-- CREATE INDEX CONCURRENTLY cannot run inside a transaction block, so it gets a migration of its
+-- own holding this one statement and nothing else; the runner applies such files outside a transaction.
+-- Candidate scans for the video archiver touch only dead rows, however large tiktok_videos is
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_tiktok_videos_inactive
+    ON tiktok_videos(updated_at, id)
+    WHERE is_active = FALSE;
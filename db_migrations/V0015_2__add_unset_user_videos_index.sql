@@ -0,0 +1,5 @@
+-- Non-transactional on its own, like V0015_1.
+-- Candidate scans for the interaction archiver touch only rows with neither like nor save
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_user_videos_unset
+    ON user_videos(updated_at, id)
+    WHERE is_liked = FALSE AND is_saved = FALSE;
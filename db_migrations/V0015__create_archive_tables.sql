@@ -0,0 +1,40 @@
+-- Cold storage for rows the app no longer reads: inactive (rejected or deleted) videos and
+-- user_videos rows with neither like nor save. Rows keep their ids so they can be restored as they were.
+-- No search_vector here: the trigger recomputes it when a video is restored
+CREATE TABLE IF NOT EXISTS tiktok_videos_archive (
+    id INTEGER PRIMARY KEY,
+    tiktok_url TEXT NOT NULL,
+    video_url TEXT NOT NULL,
+    author VARCHAR(255) NOT NULL,
+    author_avatar TEXT,
+    description TEXT,
+    likes INTEGER,
+    comments INTEGER,
+    shares INTEGER,
+    views INTEGER,
+    hashtags TEXT[],
+    is_active BOOLEAN,
+    created_at TIMESTAMP,
+    updated_at TIMESTAMP,
+    added_by VARCHAR(255),
+    moderation_status VARCHAR(50),
+    moderated_by VARCHAR(255),
+    moderated_at TIMESTAMP,
+    category VARCHAR(100),
+    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_tiktok_videos_archive_url ON tiktok_videos_archive(tiktok_url);
+
+CREATE TABLE IF NOT EXISTS user_videos_archive (
+    id INTEGER PRIMARY KEY,
+    user_id VARCHAR(255) NOT NULL,
+    video_id INTEGER NOT NULL,
+    is_liked BOOLEAN,
+    is_saved BOOLEAN,
+    created_at TIMESTAMP,
+    updated_at TIMESTAMP,
+    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_user_videos_archive_user ON user_videos_archive(user_id, video_id);
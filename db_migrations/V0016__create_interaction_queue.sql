@@ -0,0 +1,21 @@
+-- Write-behind queue for likes and saves: requests append here and return at once,
+-- a flusher coalesces events per (user_id, video_id) into bulk upserts on user_videos.
+-- NULL means the event does not touch that flag
+CREATE TABLE IF NOT EXISTS user_interaction_queue (
+    id BIGSERIAL PRIMARY KEY,
+    user_id VARCHAR(255) NOT NULL,
+    video_id INTEGER NOT NULL,
+    is_liked BOOLEAN,
+    is_saved BOOLEAN,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Client idempotency keys already accepted, so a retried request is not queued twice
+CREATE TABLE IF NOT EXISTS user_interaction_keys (
+    user_id VARCHAR(255) NOT NULL,
+    idempotency_key VARCHAR(128) NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (user_id, idempotency_key)
+);
+
+CREATE INDEX IF NOT EXISTS idx_user_interaction_keys_created ON user_interaction_keys(created_at);
@@ -494,35 +494,17 @@ export default function Index() {
       const savedVideos = videos.filter(v => v.isSaved);
       const likedVideos = videos.filter(v => v.isLiked);
       
-      for (const video of savedVideos) {
-        await fetch('https://functions.poehali.dev/be39ce1f-14f8-4292-8617-09632a97455b', {
-          method: 'POST',
-          headers: {
-            'Content-Type': 'application/json',
-            'X-User-Id': userId,
-          },
-          body: JSON.stringify({
-            action: 'save_video',
-            video_id: video.id,
-            is_saved: true,
-          }),
-        });
-      }
-      
-      for (const video of likedVideos) {
-        await fetch('https://functions.poehali.dev/be39ce1f-14f8-4292-8617-09632a97455b', {
-          method: 'POST',
-          headers: {
-            'Content-Type': 'application/json',
-            'X-User-Id': userId,
+      const actions = [
+        ...savedVideos.map(video => ({ action: 'save_video', video_id: video.id, is_saved: true })),
+        ...likedVideos.map(video => ({ action: 'like_video', video_id: video.id, is_liked: true })),
+        {
+          action: 'update_settings',
+          settings: {
+            dark_mode: darkMode,
+            language: language,
           },
-          body: JSON.stringify({
-            action: 'like_video',
-            video_id: video.id,
-            is_liked: true,
-          }),
-        });
-      }
+        },
+      ];
       
       await fetch('https://functions.poehali.dev/be39ce1f-14f8-4292-8617-09632a97455b', {
         method: 'POST',
@@ -530,13 +512,7 @@ export default function Index() {
           'Content-Type': 'application/json',
           'X-User-Id': userId,
         },
-        body: JSON.stringify({
-          action: 'update_settings',
-          settings: {
-            dark_mode: darkMode,
-            language: language,
-          },
-        }),
+        body: JSON.stringify({ actions }),
       });
       
       console.log('Data saved successfully!');